@@ -71,11 +71,9 @@ for initial_img in np.arange(initial_img_start, initial_img_end, 10):
         else:  # even starting grids
             image_s[(he-1)*msplit:(he+1)*msplit, (he-1)*msplit:(he+1)*msplit, 0] = 1/(msplit**2)
         
-        # lens it
-        image_l = lensing.lens(image_s, rc, eps, dom)
-        
-        # find number of pixels this central value projected to
-        N_end = np.sum(image_l)
+        # lens it and find number of pixels this central value projected to
+        # without storing the lensed image
+        N_end = np.sum(lensing.lens_flux(image_s, rc, eps, dom))
         
         # appedn to odds and evens depending on orig image:
         if initial_img % 2 == 1:
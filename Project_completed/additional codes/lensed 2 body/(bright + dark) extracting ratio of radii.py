@@ -13,9 +13,8 @@ can extract ratio of radii from data
 import numpy as np
 import matplotlib.pyplot as plt
 import scipy
-import Project_completed.modules.lensing_function as lensing
+import Project_completed.modules.light_curve as light
 import Project_completed.modules.class_2body as bodies
-import Project_completed.modules.draw_pixels as pix_draw
 from scipy.signal import find_peaks
 from scipy.signal import argrelextrema
 import timeit
@@ -56,9 +55,6 @@ system.initials()  # produce initial conditions in system instance
 # simulation of 2 bodies orbiting in plane, for centre positions
 # #############################################################################
 
-# initialise the list that will store integrated, bolometric 'luminosity'
-lumin_bol = []
-
 # call odeint to solve it:
 solution = scipy.integrate.odeint(system.jacobian_get, system.init, t_arr, rtol=1e-10)
 
@@ -76,39 +72,23 @@ plt.plot(xp_anim, yp_anim)
 # Animation with pixel placement
 # #############################################################################
 
-# set a stopping variable
-switchoff = False
-
-# loop over the simulation result values and plot as animation, wiht pixels
-for t_index in range(len(t_arr)):
-    
-    # reset the image and get current x values for planet and star
-    image_s = np.zeros((size, size, 3))
-    x = [xs_anim[t_index], xp_anim[t_index]]
-    
-    # scale down to domain and find which pixels these lie in
-    # NB y index is always half way up
-    index_s = np.floor((x[0] + size_source/2)/p_width)
-    index_p = np.floor((x[1] + size_source/2)/p_width)
-    index_s = index_s.astype(int).transpose() # change them to integers
-    index_p = index_p.astype(int).transpose()
-    
-    # initial checker: (if planet is in front when in line of star), using the y data
-    pfront = True
-    if abs(index_s + Star.size) > abs(index_p - Planet.size) and abs(index_s - Star.size) < abs(index_p + Planet.size):
-        if yp_anim[t_index] > ys_anim[t_index]:
-            pfront = False
-    
-    # draw on the star as a big, white circle, use prepared function.
-    image_s = pix_draw.draw_sphere(Star.size, image_s, index_s, (255, 255, 255))
-    
-    # draw on the planet as a smaller, dark circle, if not behind star
-    if pfront:
-        image_s = pix_draw.draw_sphere(Planet.size, image_s, index_p, (0, 0, 0))
-    
-    # lens the created image and update total luminosity for this iteration
-    image_lens = lensing.lens(image_s, rc, eps, dom)
-    lumin_bol.append(np.sum(image_lens/255))
+# scale down to domain and find which pixels the bodies lie in, at all
+# times at once. NB y index is always half way up
+index_s = np.floor((xs_anim + size_source/2)/p_width).astype(int)
+index_p = np.floor((xp_anim + size_source/2)/p_width).astype(int)
+
+# initial checker: (if planet is in front when in line of star), using the y data
+in_line = (abs(index_s + Star.size) > abs(index_p - Planet.size)) & (abs(index_s - Star.size) < abs(index_p + Planet.size))
+pfront = ~(in_line & (yp_anim > ys_anim))
+
+# get the lensed luminosity of a big, white star and a smaller, dark planet
+# (if not behind star) drawn on the source, from the lensed weight of each
+# source pixel, without drawing or lensing the frames
+columns = np.stack((index_s, index_p), axis=1)
+drawn = np.stack((np.ones(len(t_arr), dtype=bool), pfront), axis=1)
+weights = light.flux_weights(size, rc, eps, dom)
+lumin_bol = light.disc_light_curve(weights, columns, [Star.size, Planet.size], [(255, 255, 255), (0, 0, 0)], drawn)
+lumin_bol = np.sum(lumin_bol, axis=1)/255
 
 
 # set up a figure, axis and visuals for the light curve
@@ -122,7 +102,6 @@ ax_lc.set_ylabel(r'$L_{bol} [RGB \ sum]$', fontsize=20)
 ax_lc.plot(t_arr[:len(lumin_bol)]/year, lumin_bol)
 
 # from the found L_{bol} extract the positions of peaks and plot these on:
-lumin_bol = np.array(lumin_bol)
 peak_indexes = find_peaks(lumin_bol, height=1)[0]
 lum_maxima = lumin_bol[peak_indexes]
 ax_lc.plot(t_arr[peak_indexes]/year, lum_maxima, 'r*')
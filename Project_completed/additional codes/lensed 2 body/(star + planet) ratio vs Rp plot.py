@@ -14,9 +14,8 @@ Here I investigate the imact on the ratio of lensing by varying planet radius
 import numpy as np
 import matplotlib.pyplot as plt
 import scipy
-import Project_completed.modules.lensing_function as lensing
+import Project_completed.modules.light_curve as light
 import Project_completed.modules.class_2body as bodies
-import Project_completed.modules.draw_pixels as pix_draw
 import timeit
 
 # %%
@@ -73,6 +72,15 @@ yp_anim = solution[:, 3]
 # and light curves with and without gravitationally lensing
 # #############################################################################
 
+# scale down to domain and find which x pixels the bodies lie in, at all
+# times at once. NB y index is always half way up
+index_s = np.floor((xs_anim + size_source/2)/p_width).astype(int)
+index_p = np.floor((xp_anim + size_source/2)/p_width).astype(int)
+columns = np.stack((index_s, index_p), axis=1)
+
+# get the lensed weight of each source pixel, once for all R_p
+weights = light.flux_weights(size, rc, eps, dom)
+
 # set lists to store produced data
 orig_ratios_lst = []
 lens_ratios_lst = []
@@ -83,46 +91,18 @@ for rp in P_radii:
     # upgrade the planet size
     Planet.size_change(rp)
     
-    # initialise the lists that will store integrated, bolometric 'luminosity'
-    # for both transit data and lensed transit
-    lumin_bol = []
-    lumin_bol_lensed = []
-    
-    # loop over the simulation result values and get data from transit and lensed transit
-    for t_index in range(len(t_arr)):
-        
-        # reset the image and get current x values for planet and star
-        image_s = np.zeros((size, size, 3))
-        x = [xs_anim[t_index], xp_anim[t_index]]
-        
-        # scale down to domain and find which x pixels these lie in
-        # NB y index is always half way up
-        index_s = np.floor((x[0] + size_source/2)/p_width)
-        index_p = np.floor((x[1] + size_source/2)/p_width)
-        index_s = index_s.astype(int).transpose()  # change them to integers
-        index_p = index_p.astype(int).transpose()  # and shape correctly
-        
-        # initial checker: (if planet is in front when in line of star), using the y data
-        pfront = True
-        if abs(index_s + Star.size) > abs(index_p - Planet.size) and abs(index_s - Star.size) < abs(index_p + Planet.size):
-            if yp_anim[t_index] > ys_anim[t_index]:
-                pfront = False
-        
-        # draw on the star as a big, white circle, use prepared function.
-        image_s = pix_draw.draw_sphere(Star.size, image_s, index_s, (255, 255, 255))
-        
-        # draw on the planet as a smaller, dark circle, if not behind star
-        if pfront:
-            image_s = pix_draw.draw_sphere(Planet.size, image_s, index_p, (0, 0, 0))
-    
-        # save the luminosities into the list, lens, and save the new luminosities
-        lumin_bol.append(np.sum(image_s/255))
-        image_lens = lensing.lens(image_s, rc, eps, dom)
-        lumin_bol_lensed.append(np.sum(image_lens/255))
+    # initial checker: (if planet is in front when in line of star), using the y data
+    in_line = (abs(index_s + Star.size) > abs(index_p - Planet.size)) & (abs(index_s - Star.size) < abs(index_p + Planet.size))
+    pfront = ~(in_line & (yp_anim > ys_anim))
     
-    # turn resulting lists into arrays to slice
-    lumin_bol = np.array(lumin_bol)
-    lumin_bol_lensed = np.array(lumin_bol_lensed)
+    # get the luminosities of a big, white star and a smaller, dark planet
+    # (if not behind star) drawn on the source, and lensed, without drawing
+    # or lensing the frames
+    drawn = np.stack((np.ones(len(t_arr), dtype=bool), pfront), axis=1)
+    radii = [Star.size, Planet.size]
+    colours = [(255, 255, 255), (0, 0, 0)]
+    lumin_bol = np.sum(light.disc_light_curve(np.ones((size, size)), columns, radii, colours, drawn), axis=1)/255
+    lumin_bol_lensed = np.sum(light.disc_light_curve(weights, columns, radii, colours, drawn), axis=1)/255
     
     # from dip sizes get Radii for each and print
     ratio_lens = (lumin_bol_lensed[0] - np.min(lumin_bol_lensed))/lumin_bol_lensed[0]
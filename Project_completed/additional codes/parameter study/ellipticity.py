@@ -11,6 +11,7 @@ also, plotting average magnification as ratio of initial and final luminosities
 import numpy as np
 import matplotlib.pyplot as plt
 import Project_completed.modules.lensing_function as lensing
+import Project_completed.modules.lensing_sweep as lensing_sweep
 import Project_completed.modules.draw_pixels as pix_draw
 import timeit
 
@@ -30,26 +31,17 @@ eps_N = 300
 # set up array of set eps:
 eps_arr = np.linspace(0, 1, eps_N)
 
-# set up a total luminosity list to store it for each ellipticity
-lum_arr = []
-
 # set up the source image, with centred, circular source, use written function
 image_s = np.zeros([size, size, 3])
 image_s = pix_draw.draw_sphere(size_obj, image_s, int(size/2), (255, 0, 0))
 
-# loop over changing ellipticity, for each, lens and get total intensity:
-for epsilon in eps_arr:
-    # lens
-    image_lens = lensing.lens(image_s, rc, epsilon, dom)
-    
-    # if its first or last, save for later inset plots:
-    if epsilon == eps_arr[0]:
-        img_l_start = image_lens/255
-    elif epsilon == eps_arr[-1]:
-        img_l_end = image_lens/255
-    
-    # update the total luminosty array with sum of all pizels with colours
-    lum_arr.append(np.sum(image_lens/255))
+# for all ellipticities at once, lens and get total intensity, summing all
+# pixels in all colours, without storing the lensed images
+lum_arr = np.sum(lensing_sweep.sweep_flux(image_s, rc, eps_arr, dom), axis=1)/255
+
+# lens for first and last ellipticity, for later inset plots
+img_l_start = lensing.lens(image_s, rc, eps_arr[0], dom)/255
+img_l_end = lensing.lens(image_s, rc, eps_arr[-1], dom)/255
 
 
 # set up fiugre and axis:
@@ -10,8 +10,7 @@ Does so in 1D
 # Import modules
 import numpy as np
 import matplotlib.pyplot as plt
-from skimage.measure import regionprops
-import Project_completed.modules.lensing_function as lensing
+import Project_completed.modules.shape_distortion as shape_dist
 import timeit
 
 # %%
@@ -29,40 +28,13 @@ p_width = 2*dom/(size)  # width of each pixel
 # max number of pixels displacement from centre
 disp_max = 100
 
-# set up a list to store ratio of perimeter to area
-ratio_list = []
-
-
-# loop over different number of displacements, lensing and finding the ratio
-for disp in range(-disp_max, disp_max+1, 1):
-    
-    # set up an image of the source, with 1 pixel, at displaced position
-    image_s = np.zeros([size, size, 3])
-    #image_s[int((size-1)/2) + disp, int((size-1)/2) + disp, 0] = 1  # keep one commented
-    #image_s[int((size-1)/2), int((size-1)/2) + disp, 0] = 1
-    image_s[int((size-1)/2) + disp, int((size-1)/2), 0] = 1
-    
-    # set up an empty array to store lensed image and lens
-    image_l = np.zeros([size, size, 3])
-    image_l = lensing.lens(image_s, rc, eps, dom)
-    
-    # finding the area, perim and perim/area in lensed image:
-    # NB The area of source is one pixel = 1
-    
-    # find the area of the ending lensed image in terms of pixels:
-    nonzero_number = len(np.nonzero(image_l[:, :, 0]))  # source is only red
-    
-    # find the perimeter of the new shape:
-    image_shape = image_l[:, :, 0] != 0
-    region = regionprops(image_shape.astype(int))
-    if len(region) == 0:
-        perim = 0
-    else:
-        perim = region[0].perimeter
-    
-    # find the ratio of area to perimeter of it and append to list
-    ratio = perim/nonzero_number
-    ratio_list.append(ratio)
+# find the ratio of perimeter to area of the lensed image of every source
+# pixel at once, using the lens map, instead of lensing each one separately
+ratio_map = shape_dist.ratio_map(size, rc, eps, dom)
+
+# take the displacements along the first axis from the centre
+centre = int((size-1)/2)
+ratio_list = list(ratio_map[centre-disp_max:centre+disp_max+1, centre])
 
 
 # set up a list of all used displacement as in loop:
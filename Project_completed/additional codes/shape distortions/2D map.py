@@ -10,8 +10,7 @@ Does so in 2D and creates a map
 # Import modules
 import numpy as np
 import matplotlib.pyplot as plt
-import Project_completed.modules.lensing_function as lensing
-from skimage.measure import regionprops
+import Project_completed.modules.shape_distortion as shape_dist
 from matplotlib.colors import LogNorm
 from matplotlib import cm
 import timeit
@@ -30,50 +29,14 @@ size = 201
 # max number of pixels displacement
 disp_max = 90
 
-# set up an array to store ratio of perimeter to area in 2D
-ratio_arr = np.zeros((2*disp_max, 2*disp_max))
+# find the ratio of perimeter to area of the lensed image of every source
+# pixel at once, using the lens map, instead of lensing each one separately
+ratio_map = shape_dist.ratio_map(size, rc, eps, dom)
 
-# set up counters for array values to access
-i, j = 0, 0
-
-# loop over different number of displacements in both directions:
-for disp1 in range(-disp_max, disp_max+1, 1):
-    # reset i
-    i = 0
-    
-    # inform user of pregress
-    print('wokred out column ' + str(j) + ' out of ' + str(2*disp_max))
-    for disp2 in range(-disp_max, disp_max+1, 1):
-        
-        # set up an image of the source,  a single pixel
-        image_s = np.zeros([size, size, 3])
-        image_s[int((size-1)/2) + disp1, int((size-1)/2) + disp2, 0] = 1
-        
-        # lens it using the written funciton
-        image_l = lensing.lens(image_s, rc, eps, dom)
-        
-        # find the area of the ending lensed image in terms of pixels:
-        nonzero_number = len(np.nonzero(image_l[:, :, 0]))  # only reds
-        # NB The area of source is one pixel.
-        
-        # find the perimeteter of shape using inbuilt funciton and get ratio
-        try:
-            image_shape = image_l[:, :, 0] != 0
-            region = regionprops(image_shape.astype(int))  # Matplab translated function
-            perim = region[0].perimeter
-            
-            # find the ratio of area to perimeter of it and set to pixel data 
-            ratio = perim/nonzero_number
-            ratio_arr[i, j] = ratio
-            
-        except IndexError:
-            # shape has been lensed completely outside of the initial image
-            pass
-        
-        # update i:
-        i += 1
-    # update j
-    j += 1
+# cut out the displacements of interest, indexed as [disp2, disp1]
+# NB. source pixels lensed completely outside of the image have ratio 0
+centre = int((size-1)/2)
+ratio_arr = ratio_map[centre-disp_max:centre+disp_max, centre-disp_max:centre+disp_max].transpose()
 
 
 # set up a figure, axis
@@ -45,12 +45,9 @@ size = len(image_s[:, 0 , 0])
 # plot that image on left axis
 ax1.imshow(image_s)
 
-# set up an empty array to store lensed image and lens using function
-image_l = np.zeros([size, size, 3])
+# lens using function, the lensed image stays in uint8 RGB as read in
+# so can be plotted directly
 image_l = lensing.lens(image_s, rc, eps, dom)
-
-# correct for RGB going range 0, 1 for imshow and plot
-image_l *= 1/256
 ax2.imshow(image_l)
 
 # add a scale bar:
@@ -13,6 +13,7 @@ from matplotlib import cm
 from matplotlib.colors import LogNorm
 import Project_completed.modules.lensing_function as lensing
 import Project_completed.modules.mark_and_search_rgb as MSrgb
+import Project_completed.modules.magnification as mag
 import timeit
 
 # %%
@@ -69,9 +70,9 @@ image_lensed = lensing.lens(image_s, rc, eps, dom)
 ax2.imshow(image_lensed/255)
 
 
-# now need to count how many of each RBG combinations appear:
-results =  np.zeros([size, size])  # array to store occurances of each marker
-results = MSrgb.count_rbgs(results, image_lensed)
+# now need to count how many times each source pixel appears, histogram
+# the lens map directly, rather than searching for each RGB combination
+results = mag.mag_map(size, rc, eps, dom)
 
 # for pcolormesh plot, set up x and y grids and plot it as log sclae color map
 x = np.arange(0, size+1, 1)
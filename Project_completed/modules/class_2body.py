@@ -1,6 +1,6 @@
 '''
 
-define classes to be used in setting up and solving 2 body problems
+define classes to be used in setting up and solving 2 body (and N body) problems
 
 @author: Maciej Tomasz Jarema ppymj11
 
@@ -10,104 +10,239 @@ import numpy as np
 import matplotlib.pyplot as plt
 import scipy
 from scipy import integrate
+from numba import njit
+import Project_completed.modules.kepler_orbits as kepler
 
 # %%
 
 
+# grav constant
+G = 6.67e-11
+
+
+# masses, sizes, positions and velocities of bodies, held in arrays
+class _BodyArrays():
+    '''
+    Storage of bodies, masses and sizes in (N) arrays, positions and
+    velocities in (N x 2) arrays, viewed by each Body
+    '''
+    
+    def __init__(self, masses, sizes, positions, velocities):
+        self.masses = np.array(masses, dtype=float)
+        self.sizes = np.array(sizes)
+        self.positions = np.array(positions, dtype=float).reshape(-1, 2)
+        self.velocities = np.array(velocities, dtype=float).reshape(-1, 2)
+
+
+# define a class for a single body, with slots, as many may be set up
+class Body():
+    '''
+    A single body, with its mass, size (radius, in pixels) and initial
+    position and velocity in 2D.
+    
+    These are held in the arrays of the System the body is in (or its own
+    until put in one), such that changing them on either changes both.
+    A body is held by the last System it was put in, earlier systems keep
+    the values it had then.
+    '''
+    __slots__ = ('_arrays', '_index')
+    
+    def __init__(self, Mass, size, x, y, vx, vy):
+        assert Mass >= 0, 'Mass must be positive'
+        assert size >= 0, 'size must be positive'
+        self._arrays = _BodyArrays([Mass], [size], [x, y], [vx, vy])
+        self._index = 0
+    
+    @property
+    def Mass(self):
+        return self._arrays.masses[self._index]
+    
+    @Mass.setter
+    def Mass(self, value):
+        self._arrays.masses[self._index] = value
+    
+    @property
+    def size(self):
+        return self._arrays.sizes[self._index]
+    
+    @size.setter
+    def size(self, value):
+        self._arrays.sizes[self._index] = value
+    
+    @property
+    def pos(self):
+        '''
+        (2) array view of the position, [x, y]
+        '''
+        return self._arrays.positions[self._index]
+    
+    @pos.setter
+    def pos(self, value):
+        self._arrays.positions[self._index] = value
+    
+    @property
+    def vel(self):
+        '''
+        (2) array view of the velocity, [vx, vy]
+        '''
+        return self._arrays.velocities[self._index]
+    
+    @vel.setter
+    def vel(self, value):
+        self._arrays.velocities[self._index] = value
+    
+    def size_change(self, new):
+        '''
+        Increases body size to newly chosen, as input, int
+        '''
+        self.size += new
+
+
 # deifne a function that will set up a class instance of a single body
 def body_def(Mass, size, x, y, vx, vy):
-    class body():
-        def __init__(self, Mass, size, x, y, vx, vy):
-            assert Mass >= 0, 'Mass must be positive'
-            assert size >= 0, 'size must be positive'
-            self.Mass = Mass
-            self.size = size
-            self.pos = [x, y]
-            self.vel = [vx, vy]
+    '''
+    Sets up a Body, kept for use as before
+    '''
+    return Body(Mass, size, x, y, vx, vy)
+
+
+# derivatives of the state of N bodies, from N2L and N grav. law, compiled
+# with numba, for odeint and solve_ivp
+@njit(cache=True)
+def _nbody_derivs(y, masses, G):
+    n = len(masses)
+    derivs = np.zeros_like(y)
+    
+    # deal with substitution derivatives:
+    derivs[:2*n] = y[2*n:]
+    
+    # add the acceleration of each body due to each other one, per pair
+    for i in range(n):
+        for j in range(i+1, n):
+            dx = y[2*i] - y[2*j]
+            dy = y[2*i+1] - y[2*j+1]
+            dist = np.sqrt(dx**2 + dy**2)
+            derivs[2*n+2*i] -= (G*masses[j]/dist**3.0) * dx
+            derivs[2*n+2*i+1] -= (G*masses[j]/dist**3.0) * dy
+            derivs[2*n+2*j] -= (G*masses[i]/dist**3.0) * (-dx)
+            derivs[2*n+2*j+1] -= (G*masses[i]/dist**3.0) * (-dy)
+    
+    return derivs
+
+
+# analytic jacobian of _nbody_derivs with respect to the state
+@njit(cache=True)
+def _nbody_jac(y, masses, G):
+    n = len(masses)
+    jac = np.zeros((4*n, 4*n))
+    
+    # positions change with velocities
+    for k in range(2*n):
+        jac[k, 2*n+k] = 1
+    
+    # accelerations change with positions, by the tidal tensor of each pair
+    for i in range(n):
+        for j in range(i+1, n):
+            dx = y[2*j] - y[2*i]
+            dy = y[2*j+1] - y[2*i+1]
+            dist_sq = dx**2 + dy**2
+            dist_3 = dist_sq*np.sqrt(dist_sq)
+            tidal = np.empty((2, 2))
+            tidal[0, 0] = (1 - 3*dx*dx/dist_sq)/dist_3
+            tidal[0, 1] = -3*dx*dy/dist_sq/dist_3
+            tidal[1, 0] = tidal[0, 1]
+            tidal[1, 1] = (1 - 3*dy*dy/dist_sq)/dist_3
+            for a in range(2):
+                for b in range(2):
+                    # d(acc_i)/d(pos_j) and d(acc_j)/d(pos_i), and from
+                    # the opposite change in separation, the diagonals
+                    jac[2*n+2*i+a, 2*j+b] += G*masses[j]*tidal[a, b]
+                    jac[2*n+2*i+a, 2*i+b] -= G*masses[j]*tidal[a, b]
+                    jac[2*n+2*j+a, 2*i+b] += G*masses[i]*tidal[a, b]
+                    jac[2*n+2*j+a, 2*j+b] -= G*masses[i]*tidal[a, b]
+    
+    return jac
+
+
+# define a class for a system of any number of bodies, held in arrays
+class System(_BodyArrays):
+    '''
+    System of bodies, with their masses, sizes, positions and velocities in
+    contiguous arrays, (N), (N), (N x 2) and (N x 2). These arrays hold the
+    values of the bodies, kept as body0, body1, ..., which view them. The
+    state of the system is ordered as [x0, y0, x1, y1, ..., vx0, vy0, vx1, vy1, ...].
+    '''
+    
+    def __init__(self, *bodies):
+        # define system for however many bodies were input
+        self.bodies = list(bodies)
+        _BodyArrays.__init__(self, [body.Mass for body in self.bodies], [body.size for body in self.bodies],
+                             [body.pos for body in self.bodies], [body.vel for body in self.bodies])
         
+        # move the bodies to the arrays of the system
+        for i, body in enumerate(self.bodies):
+            body._arrays = self
+            body._index = i
+            setattr(self, 'body' + str(i), body)
         
-        def size_change(self, new):
-            '''
-            Increases body size to newly chosen, as input, int
-            '''
-            self.size += new
+        self.length = len(self.bodies)  # number of bodies
+        self.init = []  # list of initial parameters, to be generated
+    
+    # define a method to set up initials from all bodies:
+    def initials(self):
+        '''
+        Takes no inputs, returns no outputs
+        Sets up the intiial ocnditions of the system of bodies, positions
+        of each body then velocities of each body, as array in self.init,
+        a copy of the current positions and velocities
+        '''
+        self.init = np.concatenate((self.positions.ravel(), self.velocities.ravel()))
+    
+    # define a function for the derivatives of this system, for odeint:
+    def jacobian_get(self, y, x):
+        '''
+        Acts as function for odeint to get derivatives for motion.
+        takes in odeint array of variables and returns its derivastives
+        the order is set by set up initial condition in system instance
+        
+        Works for any number of bodies in 2D
+        '''
+        return _nbody_derivs(np.asarray(y, dtype=float), self.masses, G)
+    
+    def derivs(self, t, y):
+        '''
+        Derivatives of the state, as jacobian_get, in the argument order
+        of scipy.integrate.solve_ivp
+        '''
+        return _nbody_derivs(np.asarray(y, dtype=float), self.masses, G)
     
-    # run the class and return the instance of it to user
-    instance = body(Mass, size, x, y, vx, vy)
-    return instance
+    def jac(self, t, y):
+        '''
+        Analytic jacobian of derivs with respect to the state, (4N x 4N),
+        for the implicit (stiff) methods of solve_ivp, eg.
+        solve_ivp(system.derivs, t_span, system.init, method='Radau', jac=system.jac)
+        '''
+        return _nbody_jac(np.asarray(y, dtype=float), self.masses, G)
+    
+    # define a method for the exact solution, in place of odeint
+    def kepler_get(self, t_arr):
+        '''
+        Gets the exact motion from Kepler's equation at the given times,
+        same as from odeint(self.jacobian_get, self.init, t_arr), but
+        for times in any order, see kepler_orbits.propagate
+        
+        Only works for 2 bodies in 2D, after initials()
+        '''
+        return kepler.propagate(self.init, self.masses, t_arr)
 
 
 # define a function that will set up a class instance for a system of bodies
 # for any number of input bodies
 def system_def(*bodies):
-    class system():
-        def __init__(self, *bodies):
-            # define system for however many bodies were input
-            i = 0
-            for body in [*bodies]:
-                exec('self.body' + str(i) + ' = body')
-                i += 1
-            
-            self.init = []  # list of initial parameters, to be generated
-            self.length = i  # number of bodies
-        
-        # define a method to set up initials from all bodies:
-        def initials(self):
-            '''
-            Takes no inputs, returns no outputs
-            Sets up the intiial ocnditions of the system of bodies
-            Stores these in the system isnatance that it acts on
-            '''
-            # append positions of each body
-            for n in range(self.length):
-                exec('self.init.extend(self.body' + str(n) + '.pos)')
-            
-            # append velocoties of each body
-            for n in range(self.length):
-                exec('self.init.extend(self.body' + str(n) + '.vel)')
-        
-        # define a function for the jacobian of this system:
-        # this will be used by odeint, only for 2D, 2 body
-        def jacobian_get(self, y, x):
-            '''
-            Acts as function for odeint to get derivatives for motion.
-            takes in odeint array of variables and returns its derivastives
-            the order is set by set up initial condition in system instance
-            
-            Only works for 2 bodies in 2D
-            could generalise but no need for this investigation
-            '''
-            # grav constant
-            G = 6.67e-11
-            
-            # extract masses for easier reading
-            M = self.body0.Mass
-            m = self.body1.Mass
-            
-            # set up an empty list to store derivaitves:
-            derivs = np.zeros_like(y)
-            
-            # deal with substitution derivatives:
-            derivs[0] = y[4]
-            derivs[1] = y[5]
-            derivs[2] = y[6]
-            derivs[3] = y[7]
-            
-            # get the distance between the bodies
-            dist = np.sqrt((y[0] - y[2])**2 + (y[1] - y[3])**2)
-            
-            # deal with equation dependant derivatives, from N2L and N grav. law. in 1D
-            derivs[4] = -(G*m/dist**3) * (y[0] - y[2])
-            derivs[5] = -(G*m/dist**3) * (y[1] - y[3])
-            derivs[6] = -(G*M/dist**3) * (y[2] - y[0])
-            derivs[7] = -(G*M/dist**3) * (y[3] - y[1])
-            
-            # return to odeint:
-            return derivs
-    
-    # run the class and return the instance of it to user
-    instance = system(*bodies)
-    return instance
+    '''
+    Sets up a System of the given bodies, kept for use as before
+    '''
+    return System(*bodies)
 
 
 # #############################################################################
@@ -0,0 +1,160 @@
+'''
+
+define functions to find the exact motion of 2 bodies from Kepler's equation,
+instead of integrating the equations of motion, for any times, and for
+batches of systems at once
+
+@author: Maciej Tomasz Jarema ppymj11
+
+'''
+
+# import modules
+import numpy as np
+
+# %%
+
+
+# grav constant, as used by class_2body
+G = 6.67e-11
+
+# maximum number of Halley iterations in solving Kepler's equation, it
+# converges cubically from the starting guesses, in a few iterations
+KEPLER_MAX_ITER = 50
+
+
+def kepler_solve(M, e):
+    '''
+    Solves Kepler's equation for the eccentric anomaly, by Halley's method,
+    vectorised over any arrays of mean anomalies and eccentricities
+    
+    Parameters:
+    --------------
+    M - mean anomaly, array (or float), in radians
+    e - eccentricity, array (or float), broadcast with M, e < 1 solving
+        E - e sin(E) = M, e > 1 solving the hyperbolic e sinh(H) - H = M
+    
+    Returns:
+    --------------
+    array of eccentric anomalies E (or H for e > 1)
+    '''
+    M, e = np.broadcast_arrays(np.asarray(M, dtype=float), np.asarray(e, dtype=float))
+    hyperbolic = e > 1
+    
+    # reduce elliptic anomalies to [-pi, pi], and start from Danby's guess,
+    # or from asinh(M/e) for hyperbolic orbits
+    turns = np.where(hyperbolic, 0, np.round(M/(2*np.pi)))
+    M_red = M - 2*np.pi*turns
+    E = np.where(hyperbolic, np.arcsinh(M_red/np.where(hyperbolic, e, 1)), M_red + 0.85*e*np.sign(np.sin(M_red)))
+    
+    # stop iterating each anomaly once it converged, such that results do not
+    # depend on the others solved with it
+    active = np.ones(E.shape, dtype=bool)
+    for _ in range(KEPLER_MAX_ITER):
+        # function to find the root of, and its first 2 derivatives
+        sin_E = np.where(hyperbolic, np.sinh(E), np.sin(E))
+        cos_E = np.where(hyperbolic, np.cosh(E), np.cos(E))
+        f = np.where(hyperbolic, e*sin_E - E, E - e*sin_E) - M_red
+        f1 = np.where(hyperbolic, e*cos_E - 1, 1 - e*cos_E)
+        f2 = e*sin_E
+        
+        # Halley step
+        step = np.where(active, f/(f1 - f*f2/(2*f1)), 0)
+        E = E - step
+        active &= np.abs(step) > 4*np.finfo(float).eps*np.maximum(1, np.abs(E))
+        if not np.any(active):
+            break
+    
+    return E + 2*np.pi*turns
+
+
+def relative_orbit(r0, v0, mu, t):
+    '''
+    Finds the position and velocity on a Kepler orbit at times t, from those
+    at t=0, with the f and g functions of the change in eccentric anomaly
+    
+    Parameters:
+    --------------
+    r0, v0 - (..., 2) arrays of initial relative position and velocity
+    mu - array (or float) of G(M + m), broadcast with r0[..., 0]
+    t - (T) array of times, in any order
+    
+    Returns:
+    --------------
+    r, v - (..., T, 2) arrays of relative position and velocity
+    '''
+    r0, v0 = np.asarray(r0, dtype=float), np.asarray(v0, dtype=float)
+    mu = np.asarray(mu, dtype=float)[..., None]
+    t = np.asarray(t, dtype=float)
+    
+    # orbital elements, kept with a trailing axis to broadcast with times
+    r0_len = np.hypot(r0[..., 0], r0[..., 1])[..., None]
+    rv = np.sum(r0*v0, axis=-1)[..., None]
+    v0_sq = np.sum(v0*v0, axis=-1)[..., None]
+    a = 1/(2/r0_len - v0_sq/mu)
+    hyperbolic = a < 0
+    n = np.sqrt(mu/np.abs(a)**3)
+    
+    # initial eccentric anomaly, from e cos(E0) and e sin(E0)
+    e_cos = 1 - r0_len/a
+    e_sin = rv/np.sqrt(mu*np.abs(a))
+    e = np.where(hyperbolic, np.sqrt(np.abs(e_cos**2 - e_sin**2)), np.hypot(e_cos, e_sin))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        E0 = np.where(hyperbolic, np.arctanh(e_sin/e_cos), np.arctan2(e_sin, e_cos))
+    M0 = np.where(hyperbolic, e_sin - E0, E0 - e_sin)
+    
+    # solve for the eccentric anomaly at each time
+    E = kepler_solve(M0 + n*t, e)
+    dE = E - E0
+    
+    # f and g functions, and their time derivatives
+    sin_dE = np.where(hyperbolic, np.sinh(dE), np.sin(dE))
+    one_cos = np.where(hyperbolic, 1 - np.cosh(dE), 1 - np.cos(dE))
+    f = 1 - a/r0_len*one_cos
+    g = t - np.where(hyperbolic, sin_dE - dE, dE - sin_dE)/n
+    r_len = np.where(hyperbolic, a*(1 - (e_cos*np.cosh(dE) + e_sin*np.sinh(dE))),
+                     a*(1 - (e_cos*np.cos(dE) - e_sin*np.sin(dE))))
+    f_dot = -np.sqrt(mu*np.abs(a))*sin_dE/(r_len*r0_len)
+    g_dot = 1 - a/r_len*one_cos
+    
+    r = f[..., None]*r0[..., None, :] + g[..., None]*v0[..., None, :]
+    v = f_dot[..., None]*r0[..., None, :] + g_dot[..., None]*v0[..., None, :]
+    return r, v
+
+
+def propagate(init, masses, t):
+    '''
+    Finds the exact motion of 2 bodies, as found by odeint with
+    class_2body system_def(...).jacobian_get, for any times, and for any
+    batch of systems at once
+    
+    Parameters:
+    --------------
+    init - (8) or (S x 8) array of initial conditions, ordered as by
+           system_def(...).initials(): [x0, y0, x1, y1, vx0, vy0, vx1, vy1]
+    masses - (2) or (S x 2) array of masses of body 0 and body 1
+    t - (T) array of times to find the state at, from t=0 of init, in any
+        order, eg. as queried from an animation
+    
+    Returns:
+    --------------
+    (T x 8) array of states, in the order of init, or (S x T x 8) for
+    batches, as the solution returned by odeint
+    '''
+    init = np.asarray(init, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    t = np.asarray(t, dtype=float)
+    M, m = masses[..., 0:1], masses[..., 1:2]
+    
+    # split into centre of mass, moving uniformly, and relative motion
+    pos_0, pos_1 = init[..., 0:2], init[..., 2:4]
+    vel_0, vel_1 = init[..., 4:6], init[..., 6:8]
+    pos_cm = (M*pos_0 + m*pos_1)/(M + m)
+    vel_cm = (M*vel_0 + m*vel_1)/(M + m)
+    r, v = relative_orbit(pos_0 - pos_1, vel_0 - vel_1, G*(M[..., 0] + m[..., 0]), t)
+    
+    # put the bodies back about the centre of mass at each time
+    cm = pos_cm[..., None, :] + vel_cm[..., None, :]*t[:, None]
+    frac_0, frac_1 = (m/(M + m))[..., None, :], (M/(M + m))[..., None, :]
+    states = np.concatenate((cm + frac_0*r, cm - frac_1*r,
+                             vel_cm[..., None, :] + frac_0*v, vel_cm[..., None, :] - frac_1*v), axis=-1)
+    return states
@@ -0,0 +1,213 @@
+'''
+
+define functions for the exact, analytic Jacobian of the lens equation used
+in lensing_function, giving magnification, convergence and shear at any point,
+and critical curves and caustics, without sampling the image with pixels
+
+@author: Maciej Tomasz Jarema ppymj11
+
+'''
+
+# import modules
+import numpy as np
+from skimage import measure
+
+# %%
+
+
+def grid(size, dom=1):
+    '''
+    Gets the reduced coordinates of the pixel centres of a square image, as
+    used by lensing_function.lens, r1 along rows and r2 along columns
+    
+    Parameters:
+    --------------
+    - number of pixels per side of the square image, size (int)
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    Returns:
+    --------------
+    r1, r2 - (N x N) arrays of coordinates
+    '''
+    i_arr = np.arange(0, size, 1)
+    r = 2*dom*i_arr/(size) - dom + 2*dom/(size)/2
+    return np.meshgrid(r, r, indexing='ij')
+
+
+def deflection_derivatives(r1, r2, rc, eps):
+    '''
+    Finds the derivatives of the deflection alpha = r - s of the lens
+    equation, s = r - (1 -+ eps) r / sqrt(rc^2 + (1-eps) r1^2 + (1+eps) r2^2)
+    
+    Parameters:
+    --------------
+    r1, r2 - arrays (or floats) of reduced image plane coordinates
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    
+    Returns:
+    --------------
+    a11, a12, a22 - d(alpha1)/d(r1), d(alpha1)/d(r2) = d(alpha2)/d(r1) and
+    d(alpha2)/d(r2), nan at the centre for rc=0
+    '''
+    r1, r2 = np.asarray(r1, dtype=float), np.asarray(r2, dtype=float)
+    e1, e2 = 1 - eps, 1 + eps
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        root = np.sqrt(rc**2 + e1*r1**2 + e2*r2**2)
+        root3 = root**3
+        a11 = e1/root - (e1*r1)**2/root3
+        a12 = -e1*e2*r1*r2/root3
+        a22 = e2/root - (e2*r2)**2/root3
+    
+    return a11, a12, a22
+
+
+def jacobian(r1, r2, rc, eps):
+    '''
+    Finds the Jacobian A = ds/dr of the lens equation, symmetric
+    
+    Parameters:
+    --------------
+    r1, r2 - arrays (or floats) of reduced image plane coordinates
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    
+    Returns:
+    --------------
+    A11, A12, A22 - components of A, with A21 = A12
+    '''
+    a11, a12, a22 = deflection_derivatives(r1, r2, rc, eps)
+    return 1 - a11, -a12, 1 - a22
+
+
+def convergence_shear(r1, r2, rc, eps):
+    '''
+    Finds the convergence and shear fields of the lens
+    
+    Parameters:
+    --------------
+    r1, r2 - arrays (or floats) of reduced image plane coordinates
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    
+    Returns:
+    --------------
+    kappa - convergence, (a11 + a22)/2
+    gamma1, gamma2 - shear components, (a11 - a22)/2 and a12
+    '''
+    a11, a12, a22 = deflection_derivatives(r1, r2, rc, eps)
+    return (a11 + a22)/2, (a11 - a22)/2, a12
+
+
+def magnification(r1, r2, rc, eps):
+    '''
+    Finds the signed magnification 1/det(A) at points of the image plane,
+    negative for images of flipped parity, infinite on critical curves
+    
+    Parameters:
+    --------------
+    r1, r2 - arrays (or floats) of reduced image plane coordinates
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    
+    Returns:
+    --------------
+    array of magnifications, same shape as r1
+    '''
+    A11, A12, A22 = jacobian(r1, r2, rc, eps)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 1/(A11*A22 - A12**2)
+
+
+def mag_field(size, rc, eps, dom=1):
+    '''
+    Finds the magnification at each pixel centre of a lensed image, as
+    given by lensing_function.lens, exactly, with no sampling noise
+    
+    Parameters:
+    --------------
+    - number of pixels per side of the square image, size (int)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    Returns:
+    --------------
+    (N x N) array of signed magnifications, see magnification
+    '''
+    r1, r2 = grid(size, dom)
+    return magnification(r1, r2, rc, eps)
+
+
+def source_position(r1, r2, rc, eps):
+    '''
+    Maps points of the image plane to the source plane with the lens equation
+    
+    Parameters:
+    --------------
+    r1, r2 - arrays (or floats) of reduced image plane coordinates
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    
+    Returns:
+    --------------
+    s1, s2 - arrays of source plane coordinates
+    '''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        root = np.sqrt(rc**2 + (1 - eps)*r1**2 + (1 + eps)*r2**2)
+        s1 = r1 - ((1 - eps)*r1)/root
+        s2 = r2 - ((1 + eps)*r2)/root
+    return s1, s2
+
+
+def critical_curves(size, rc, eps, dom=1):
+    '''
+    Finds the critical curves of the lens, where det(A) = 0, by marching
+    squares on det(A) sampled at the pixel centres of an image
+    
+    Parameters:
+    --------------
+    - number of pixels per side of the sampling grid, size (int)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the grid, as absolute value (default=1, giving range [-1, 1])
+    
+    Returns:
+    --------------
+    list of (M x 2) arrays of (r1, r2) points along each curve, closed
+    curves have the same first and last point
+    '''
+    r1, r2 = grid(size, dom)
+    A11, A12, A22 = jacobian(r1, r2, rc, eps)
+    det = A11*A22 - A12**2
+    
+    # the centre, for rc=0, is not a critical curve
+    det = np.where(np.isfinite(det), det, 1)
+    
+    # convert the fractional pixel indices of contours to coordinates
+    p_width = 2*dom/(size)
+    return [contour*p_width - dom + p_width/2 for contour in measure.find_contours(det, 0)]
+
+
+def caustics(size, rc, eps, dom=1):
+    '''
+    Finds the caustics of the lens, as the critical curves mapped to the
+    source plane
+    
+    Parameters:
+    --------------
+    - number of pixels per side of the sampling grid, size (int)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the grid, as absolute value (default=1, giving range [-1, 1])
+    
+    Returns:
+    --------------
+    critical - list of (M x 2) arrays of critical curves, see critical_curves
+    caustic - list of (M x 2) arrays of (s1, s2) points of the caustic of
+              each critical curve
+    '''
+    critical = critical_curves(size, rc, eps, dom)
+    caustic = [np.stack(source_position(c[:, 0], c[:, 1], rc, eps), axis=1) for c in critical]
+    return critical, caustic
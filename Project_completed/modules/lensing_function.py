@@ -7,42 +7,80 @@ define a fucntion that will lens a given image
 '''
 
 # import needed module
+import functools
+import hashlib
+import os
 import numpy as np
+from numba import jit, njit, prange
 
 # %%
 
 
-def lens(image_s, rc, eps, dom=1):
+# maximum number of lens maps kept in memory at once, each one stores two
+# (N x N) integer arrays of indices, so keep this modest for large N. Read
+# when the cache is built, on import, change it with set_cache_size
+MAP_CACHE_SIZE = 8
+
+# fraction of nonzero source pixels below which lens renders the source
+# through the inverse lens map, in time proportional to the pixels hit
+SPARSE_FRACTION = 0.01
+
+# approximate number of bytes of frames lensed at once from a stack, such
+# that memory-mapped stacks are only read in chunks of this size
+STACK_CHUNK_BYTES = 2**28
+
+# number of blocks of rows summed separately by lens_flux, fixed so that the
+# order of the sums, and so the result, does not depend on the threads used
+FLUX_BLOCKS = 64
+
+# distance of a mapped coordinate from a pixel edge, in pixels, within which
+# map_indices_symmetric does not trust the reflected value to fall into the
+# same pixel, and evaluates the lens equation directly instead
+EDGE_TOL = 1e-6
+
+# interpolation modes of lens_interpolated, with their codes used in the
+# compiled kernel and the half width of their kernels, in pixels
+INTERP_MODES = {'bilinear': (1, 1), 'bicubic': (2, 2), 'lanczos': (3, 3)}
+BOUNDARY_MODES = {'zero': 0, 'clamp': 1}
+
+# precision of lens map computations, used when not given to get_map or lens
+# 'float64' (default) or 'float32', see set_precision
+PRECISION = 'float64'
+
+# number of rows of the float32 map computed at once, to bound temporaries
+FLOAT32_ROWS = 256
+
+# directory of the on-disk store of lens maps, shared by all runs, None to
+# not store maps, set from the LENS_MAP_STORE environment variable, or by
+# set_map_store
+MAP_STORE = os.environ.get('LENS_MAP_STORE')
+
+# name of the lens model, part of the key of stored maps, change if the lens
+# equation, or how maps are computed from it, changes
+LENS_MODEL = 'elliptical_core_v1'
+
+
+def map_indices(size, rc, eps, dom=1):
     '''
-    Lenses the given image for a planar, transparent, symmetric lensing object
+    Finds which source image pixel each lensed image pixel samples, using
+    the lens equation for a planar, transparent, symmetric lensing object
     positioned at the centre of the image
     
     Parameters:
     --------------
-    - square image as numpy array of values from 0 to 255 in RGB (N x N x 3)
+    - number of pixels per side of the square image, size (int)
     - central core radius rc (float)
     - ellipticity eps (float)
     - domain of the image, as absolute value (default=1, giving range [-1, 1])
     
     Returns:
     --------------
-    array of the lensed image (N x N x 3)
+    index_1, index_2 - (N x N) integer arrays of source pixel row and column
+    indices for each lensed image pixel. These are not bounds checked
     '''
     
-    # check if the user gave a square image and get number of pixels per side
-    if len(image_s[:, 0, 0]) == len(image_s[0, :, 0]):
-        size = len(image_s)
-    else:
-        raise TypeError('Image must be square, can\'t broadcast with different shapes')
-    
-    # set up an empty array to store lensed image
-    image_l = np.zeros([size, size, 3])
     p_width = 2*dom/(size)  # get pixel width
     
-    # #########################################################################
-    # Vectorised mapping of pixels to source plane and copying data:
-    # #########################################################################
-    
     # set up an array of index numbers corr. to lensed image array
     i_arr = np.arange(0, size, 1)
     j_arr = np.arange(0, size, 1)
@@ -60,13 +98,1370 @@ def lens(image_s, rc, eps, dom=1):
     # find which pixel the s1's and s2's all lie in, in the original image
     index_1 = np.floor((s1 + dom)/p_width)
     index_2 = np.floor((s2 + dom)/p_width)
-    index_1 = index_1.astype(int).transpose()  # change them to integers
-    index_2 = index_2.astype(int).transpose()  # and tranpose to match directions
     
-    # copy the data from source image at these indexes over to lens image array
-    image_l[:, :, :] += image_s[index_1, index_2, :]        
+    # change them to integers and tranpose to match directions, keeping them
+    # contiguous in memory so gathers read them in order
+    index_1 = np.ascontiguousarray(index_1.astype(int).transpose())
+    index_2 = np.ascontiguousarray(index_2.astype(int).transpose())
     
-    # return the image to the suer
-    return image_l
+    return index_1, index_2
+
+
+def map_indices_symmetric(size, rc, eps, dom=1):
+    '''
+    Finds the same source pixel indices as map_indices, but evaluates the lens
+    equation only on one quadrant of the image (one octant for eps=0) and
+    fills the rest by reflection, using that the lens is mirror symmetric
+    about both axes (and axisymmetric for eps=0).
+    
+    Reflected values are only used where the mapped position is further than
+    EDGE_TOL pixels from a pixel edge, other pixels are evaluated directly,
+    so the result is identical to map_indices.
+    
+    Parameters:
+    --------------
+    - number of pixels per side of the square image, size (int)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    Returns:
+    --------------
+    index_1, index_2 - (N x N) integer arrays of source pixel row and column
+    indices for each lensed image pixel. These are not bounds checked
+    '''
+    
+    index_1 = np.empty((size, size), dtype=int)
+    index_2 = np.empty((size, size), dtype=int)
+    half = (size + 1)//2
+    unsure = np.zeros((half, half), dtype=np.bool_)
+    
+    # evaluate the quadrant, or for eps=0 its upper triangle and swap axes
+    # to get the lower one, filling the rest of the image by reflection
+    if eps == 0:
+        _quadrant_map_kernel(float(rc), 0.0, float(dom), index_1, index_2, unsure, True)
+        _transpose_map_kernel(float(rc), 0.0, float(dom), index_1, index_2, unsure)
+    else:
+        _quadrant_map_kernel(float(rc), float(eps), float(dom), index_1, index_2, unsure, False)
+    
+    return index_1, index_2
+
+
+def map_indices_float32(size, rc, eps, dom=1):
+    '''
+    Finds the source pixel indices as map_indices does, but with all
+    coordinate and lens equation arithmetic in float32, storing indices
+    in the smallest integer type that holds them (int16 up to size 32766).
+    
+    Error bound, against map_indices (float64): indices differ by at most
+    one pixel, for a fraction of about 6e-8*N of the pixels, (measured
+    1e-4 at N=2048, 5e-4 at N=8192), from rays landing within float32
+    rounding of a pixel edge. Small images can have more, as rays along the
+    axes can land exactly on pixel edges. Indices outside [-N, N) are
+    clipped to -N-1 or N, so they stay outside of the source image.
+    
+    Parameters:
+    --------------
+    - number of pixels per side of the square image, size (int)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    Returns:
+    --------------
+    index_1, index_2 - (N x N) integer arrays of source pixel row and column
+    indices for each lensed image pixel. These are not bounds checked
+    '''
+    
+    # use constants in float32, so that no arithmetic is promoted
+    f32 = np.float32
+    rc, eps, dom32 = f32(rc), f32(eps), f32(dom)
+    p_width = f32(2*dom/(size))
+    
+    # reduced coordinates, as in map_indices, rounded to float32
+    i_arr = np.arange(0, size, 1)
+    r = (2*dom*i_arr/(size) - dom + 2*dom/(size)/2).astype(f32)
+    
+    index_type = _index_dtype(size)
+    index_1 = np.empty((size, size), dtype=index_type)
+    index_2 = np.empty((size, size), dtype=index_type)
+    
+    # lens a block of rows at a time
+    r2 = r[None, :]
+    for start in range(0, size, FLOAT32_ROWS):
+        r1 = r[start:start+FLOAT32_ROWS, None]
+        root = np.sqrt(rc*rc + (f32(1) - eps)*r1*r1 + (f32(1) + eps)*r2*r2)
+        t1 = (r1 - ((f32(1) - eps)*r1)/root + dom32)/p_width
+        t2 = (r2 - ((f32(1) + eps)*r2)/root + dom32)/p_width
+        
+        # clip, such that indices outside of the source stay outside of it
+        # when stored in the smaller integer type, inc. nan at the centre
+        for t, index in ((t1, index_1), (t2, index_2)):
+            t = np.where(np.isfinite(t), np.floor(t), -size - 1)
+            index[start:start+FLOAT32_ROWS] = np.clip(t, -size - 1, size)
+    
+    return index_1, index_2
+
+
+def _index_dtype(size):
+    '''
+    Smallest signed integer type holding indices in [-N-1, N]
+    '''
+    if size < np.iinfo(np.int16).max:
+        return np.int16
+    return np.int32
+
+
+def set_precision(precision):
+    '''
+    Sets the precision used for lens maps globally, when not given to
+    get_map or lens
+    
+    Parameters:
+    --------------
+    precision - 'float64' (default, exact), or 'float32', computing
+                maps in single precision and storing indices in smaller
+                integer types, see map_indices_float32 for its error
+    '''
+    global PRECISION
+    if precision not in ('float64', 'float32'):
+        raise ValueError('precision must be \'float64\' or \'float32\'')
+    PRECISION = precision
+
+
+def set_map_store(path):
+    '''
+    Sets the directory of the on-disk lens map store, such that maps built
+    once are loaded (memory mapped) by later runs, instead of rebuilt
+    
+    Parameters:
+    --------------
+    path - directory to store maps in, created if needed, or None to
+           not use the store
+    '''
+    global MAP_STORE
+    MAP_STORE = None if path is None else str(path)
+
+
+def _store_path(size, rc, eps, dom, precision):
+    '''
+    Path of the store entry for the given map, named by a hash of its key,
+    or None if the store is not set
+    '''
+    if MAP_STORE is None:
+        return None
+    
+    # exact (hex) floats, such that only identical parameters share entries
+    key = (int(size), float(rc).hex(), float(eps).hex(), float(dom).hex(), LENS_MODEL, precision)
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()
+    return os.path.join(MAP_STORE, digest)
+
+
+def _store_arrays(path, **arrays):
+    '''
+    Saves arrays to .npy files of the given store entry, each written to a
+    temporary file first, so that other runs never load partial files
+    '''
+    os.makedirs(path, exist_ok=True)
+    for name, arr in arrays.items():
+        temp = os.path.join(path, name + '.' + str(os.getpid()) + '.tmp.npy')
+        np.save(temp, arr)
+        os.replace(temp, os.path.join(path, name + '.npy'))
+
+
+def _read_only(arr):
+    '''
+    Marks an array as read only, such that arrays shared through the
+    cache can not be changed in place by one caller for all others
+    '''
+    if arr is not None:
+        arr.flags.writeable = False
+    return arr
+
+
+def _load_arrays(path, *names):
+    '''
+    Opens the named arrays of a store entry as read only memory maps,
+    or returns None if the entry does not have all of them
+    '''
+    if path is None:
+        return None
+    files = [os.path.join(path, name + '.npy') for name in names]
+    if not all(os.path.exists(file) for file in files):
+        return None
+    return [np.load(file, mmap_mode='r') for file in files]
+
+
+class LensMap():
+    '''
+    Precomputed lens map for a fixed (size, rc, eps, dom) configuration.
+    Owns the gather indices, such that lensing an image reduces to
+    a single copy of the source pixel data.
+    
+    Use get_map() to obtain instances, so that repeated configurations
+    are shared through the cache. With a map store set (see set_map_store)
+    maps, and their inverses, are loaded from disk if they were built by
+    any earlier run, and saved there otherwise.
+    '''
+    
+    def __init__(self, size, rc, eps, dom=1, precision='float64', indices=None, flat=None,
+                 source_ids=None, inverse=None):
+        '''
+        Builds the map, or wraps given (eg. shared memory) arrays
+        
+        kwargs:
+        --------------
+        indices - (index_1, index_2) of an already built map, default=None
+                  builds them, or loads them from the map store
+        flat - its flat indices, default=None computes them when needed
+        source_ids - its source_ids, default=None computes them when needed
+        inverse - its (offsets, pixels) inverse, default=None loads or
+                  computes them when needed
+        '''
+        self.size = size
+        self.rc = rc
+        self.eps = eps
+        self.dom = dom
+        self.precision = precision
+        self._store = _store_path(size, rc, eps, dom, precision)
+        
+        # load the map from the store, if it was built before
+        stored = indices
+        if stored is None:
+            stored = _load_arrays(self._store, 'index_1', 'index_2')
+        if stored is not None:
+            self.index_1, self.index_2 = stored
+        elif precision == 'float32':
+            self.index_1, self.index_2 = map_indices_float32(size, rc, eps, dom)
+        else:
+            self.index_1, self.index_2 = map_indices_symmetric(size, rc, eps, dom)
+        
+        # store new maps in the smallest integer type, clipped as in
+        # map_indices_float32, such that out of range indices stay so
+        if stored is None and self._store is not None:
+            index_type = _index_dtype(size)
+            _store_arrays(self._store,
+                          index_1=np.clip(self.index_1, -size - 1, size).astype(index_type),
+                          index_2=np.clip(self.index_2, -size - 1, size).astype(index_type))
+        
+        # all arrays of the map are shared by its users, so are read only
+        _read_only(self.index_1)
+        _read_only(self.index_2)
+        self._flat = _read_only(flat)
+        self._source_ids = _read_only(source_ids)
+        self._inverse = None if inverse is None else tuple(_read_only(arr) for arr in inverse)
+    
+    @property
+    def flat(self):
+        '''
+        (N x N) indices into the flattened (N*N) source image, negative
+        indices wrapped around as numpy fancy indexing would do.
+        Stored as int32 for float32 maps, where they fit.
+        '''
+        if self._flat is None:
+            size = self.size
+            
+            # mimic numpy for indices that could not index the source image
+            for index in (self.index_1, self.index_2):
+                if np.any((index >= size) | (index < -size)):
+                    raise IndexError('lens map samples outside of the source image of size ' + str(size))
+            
+            flat = (self.index_1.astype(np.int64) % size)*size + (self.index_2 % size)
+            if self.precision == 'float32' and size*size <= np.iinfo(np.int32).max:
+                flat = flat.astype(np.int32)
+            self._flat = _read_only(flat)
+        return self._flat
+    
+    @property
+    def source_ids(self):
+        '''
+        (N x N) integer array of the flattened source pixel index (row*N + col)
+        sampled by each lensed image pixel, -1 for rays that leave the source
+        plane. Stored as int32 when all indices fit, int64 otherwise.
+        '''
+        if self._source_ids is None:
+            size = self.size
+            index_1, index_2 = self.index_1, self.index_2
+            
+            # pick the smallest integer type that can label every source pixel
+            if size*size <= np.iinfo(np.int32).max:
+                id_type = np.int32
+            else:
+                id_type = np.int64
+            
+            # label rays by source pixel, marking those landing outside
+            inside = (index_1 >= 0) & (index_1 < size) & (index_2 >= 0) & (index_2 < size)
+            ids = np.full((size, size), -1, dtype=id_type)
+            ids[inside] = index_1[inside].astype(id_type)*size + index_2[inside]
+            self._source_ids = _read_only(ids)
+        return self._source_ids
+    
+    @property
+    def inverse(self):
+        '''
+        Inverse lens index in CSR form, mapping each source pixel to the
+        lensed image pixels that sample it. Consistent with the (wrapped)
+        gather indices of flat.
+        
+        Returns:
+        --------------
+        offsets - (N*N + 1) array, the lensed pixels sampling flattened
+                  source pixel k are pixels[offsets[k]:offsets[k+1]]
+        pixels - (N*N) array of flattened lensed image pixel indices
+        '''
+        if self._inverse is None:
+            self._inverse = _load_arrays(self._store, 'offsets', 'pixels')
+        if self._inverse is None:
+            flat = self.flat.ravel()
+            
+            # group lensed pixels by their source pixel, counting group sizes
+            pixels = np.argsort(flat, kind='stable')
+            counts = np.bincount(flat, minlength=self.size*self.size)
+            offsets = np.zeros(self.size*self.size + 1, dtype=pixels.dtype)
+            np.cumsum(counts, out=offsets[1:])
+            
+            # pixel indices fit int32 for all but the largest maps
+            if self.size*self.size < np.iinfo(np.int32).max:
+                offsets, pixels = offsets.astype(np.int32), pixels.astype(np.int32)
+            self._inverse = (_read_only(offsets), _read_only(pixels))
+            if self._store is not None:
+                _store_arrays(self._store, offsets=offsets, pixels=pixels)
+        return self._inverse
+    
+    def lens_sparse(self, image_s, out=None):
+        '''
+        Lenses the given image by scattering only its nonzero pixels through
+        the inverse map, giving the same result as lens(), but in time
+        proportional to the lensed pixels hit. Use for mostly empty sources.
+        
+        Parameters:
+        --------------
+        image_s - (N x N x 3) source image, N must match the map size
+        
+        kwargs:
+        --------------
+        out - array of same shape and dtype as image_s to write the
+              lensed image into, default=None creates a new one
+        
+        Returns:
+        --------------
+        array of the lensed image (N x N x 3), of the same dtype as image_s
+        '''
+        
+        if np.shape(image_s)[:2] != (self.size, self.size):
+            raise TypeError('Image must be square, of the same size as the lens map')
+        
+        # set up the lensed image as empty
+        out = _check_out(out, image_s)
+        out[...] = 0
+        
+        # copy the source pixels with any colour in them to all lensed pixels
+        # that sample them
+        image_flat = image_s.reshape(self.size*self.size, -1)
+        offsets, pixels = self.inverse
+        _scatter(image_flat, offsets, pixels, out.reshape(self.size*self.size, -1))
+        return out
+    
+    def lens(self, image_s, out=None):
+        '''
+        Lenses the given image using the precomputed map
+        
+        Parameters:
+        --------------
+        image_s - (N x N x 3) source image, N must match the map size
+        
+        kwargs:
+        --------------
+        out - array of same shape and dtype as image_s to write the
+              lensed image into, default=None creates a new one
+        
+        Returns:
+        --------------
+        array of the lensed image (N x N x 3), of the same dtype as image_s
+        '''
+        
+        if np.shape(image_s)[:2] != (self.size, self.size):
+            raise TypeError('Image must be square, of the same size as the lens map')
+        
+        # single gather over the flattened pixels, straight into the output
+        # NB. indices in flat are already checked, so no need to buffer
+        out = _check_out(out, image_s)
+        image_flat = image_s.reshape(self.size*self.size, -1)
+        if image_flat.shape[1] == 3:
+            # RGB pixels copied channel by channel, about twice as fast as
+            # np.take, which loops over the channels
+            _gather_rgb_kernel(image_flat, self.flat.ravel(), out.reshape(self.size*self.size, 3))
+        elif self.flat.dtype == np.intp:
+            np.take(image_flat, self.flat, axis=0, out=out.reshape(self.size, self.size, -1), mode='clip')
+        else:
+            # np.take would convert smaller indices to intp first
+            _gather_kernel(image_flat, self.flat.ravel(), out.reshape(self.size*self.size, -1))
+        return out
+    
+    def lens_packed(self, packed, out=None):
+        '''
+        Lenses an image packed as one uint32 per pixel (see pack_rgb), moving
+        each pixel in a single 4 byte load and store, about twice as fast
+        as lens() on RGB images, when the image is kept packed over many
+        calls, eg. for a source only moved between frames
+        
+        Parameters:
+        --------------
+        packed - (N x N) uint32 packed source image, N must match the map size
+        
+        kwargs:
+        --------------
+        out - (N x N) uint32 array to write the packed lensed image into,
+              default=None creates a new one
+        
+        Returns:
+        --------------
+        (N x N) uint32 array of the packed lensed image, see unpack_rgb
+        '''
+        
+        if np.shape(packed) != (self.size, self.size) or packed.dtype != np.uint32:
+            raise TypeError('Packed image must be a square uint32 array, of the same size as the lens map')
+        
+        out = _check_out(out, packed)
+        _packed_gather_kernel(packed.ravel(), self.flat, out)
+        return out
+    
+    def flux(self, image_s):
+        '''
+        Finds the total flux of the lensed image in each colour channel,
+        summing the source pixels sampled by the map, without storing the
+        lensed image. Same as lens_flux, but reusing the precomputed map.
+        
+        Parameters:
+        --------------
+        image_s - (N x N x 3) source image, N must match the map size
+        
+        Returns:
+        --------------
+        array of summed pixel values in each channel of the lensed image (3)
+        '''
+        
+        if np.shape(image_s)[:2] != (self.size, self.size):
+            raise TypeError('Image must be square, of the same size as the lens map')
+        
+        image_flat = image_s.reshape(self.size*self.size, -1)
+        block_sums = np.zeros((min(FLUX_BLOCKS, self.size), image_flat.shape[1]))
+        _flux_gather_kernel(image_flat, self.flat.ravel(), block_sums)
+        return np.sum(block_sums, axis=0)
+    
+    def lens_stack(self, frames, out=None):
+        '''
+        Lenses a stack of frames with the same map, applying one gather to
+        a chunk of frames at a time. Frames and out may be memory-mapped
+        arrays, in which case only one chunk is held in memory at once.
+        
+        Parameters:
+        --------------
+        frames - (T x N x N x 3) stack of source images, N must match the map
+        
+        kwargs:
+        --------------
+        out - array of same shape and dtype as frames to write the lensed
+              frames into, eg. from np.lib.format.open_memmap,
+              default=None creates a new one
+        
+        Returns:
+        --------------
+        (T x N x N x 3) array of lensed frames, of the same dtype as frames
+        '''
+        
+        if np.ndim(frames) != 4 or np.shape(frames)[1:3] != (self.size, self.size):
+            raise TypeError('Frames must be a stack of square images, of the same size as the lens map')
+        
+        out = _check_out(out, frames)
+        n_pix = self.size*self.size
+        
+        # get number of frames that fit in a chunk, at least one
+        chunk = max(1, STACK_CHUNK_BYTES // max(1, frames[0].nbytes))
+        
+        # gather each chunk of frames at once, over the flattened pixels
+        for t in range(0, len(frames), chunk):
+            frames_flat = np.asarray(frames[t:t+chunk]).reshape(-1, n_pix, frames.shape[3])
+            out_flat = out[t:t+chunk].reshape(-1, n_pix, frames.shape[3])
+            np.take(frames_flat, self.flat.ravel(), axis=1, out=out_flat, mode='clip')
+        
+        return out
+
+
+def _check_out(out, image_s):
+    '''
+    Returns out, checked to match the shape and dtype of image_s, and
+    C-contiguous, or a new empty array like image_s if out is None
+    '''
+    if out is None:
+        return np.empty(np.shape(image_s), dtype=image_s.dtype)
+    if np.shape(out) != np.shape(image_s) or out.dtype != image_s.dtype:
+        raise TypeError('out must have the same shape and dtype as the image')
+    if not out.flags.c_contiguous:
+        raise TypeError('out must be a C-contiguous array')
+    return out
+
+
+# use numba jit for the loop over the irregular lists of the inverse map
+@jit(nopython=True, cache=True)
+def _scatter(image_flat, offsets, pixels, image_l):
+    '''
+    Copies each nonzero source pixel to all lensed pixels listed for it
+    in the inverse (CSR) lens map, all images flattened to (N*N x 3)
+    '''
+    for k in range(len(image_flat)):
+        # skip empty source pixels, lensed image starts as zeros
+        empty = True
+        for c in range(image_flat.shape[1]):
+            if image_flat[k, c] != 0:
+                empty = False
+        if empty:
+            continue
+        
+        for n in range(offsets[k], offsets[k+1]):
+            image_l[pixels[n], :] = image_flat[k, :]
+
+
+# lens equation for a single ray, compiled to be used inside other kernels
+# with numpy error handling, so 0/0 at the centre gives nan, as in map_indices
+@njit(error_model='numpy', cache=True)
+def source_position(i, j, rc, eps, dom, size):
+    '''
+    Finds the position on the source plane of the ray through lensed pixel
+    (i, j), in units of pixels from the source image edge, such that its floor
+    gives the source pixel, following the same floating point operations
+    as map_indices.
+    '''
+    p_width = 2*dom/(size)
+    r1 = 2*dom*i/(size) - dom + p_width/2
+    r2 = 2*dom*j/(size) - dom + p_width/2
+    return ray_position(r1, r2, rc, eps, dom, p_width)
+
+
+@njit(error_model='numpy', cache=True)
+def ray_position(r1, r2, rc, eps, dom, p_width):
+    '''
+    Finds the position on the source plane, in units of pixels from the
+    source image edge, of the ray through reduced coordinates (r1, r2)
+    '''
+    
+    # lens equation, for position on image_s
+    root = np.sqrt(rc**2 + (1 - eps)*r1**2 + (1 + eps)*r2**2)
+    s1 = r1 - ((1 - eps)*r1)/root
+    s2 = r2 - ((1 + eps)*r2)/root
+    return (s1 + dom)/p_width, (s2 + dom)/p_width
+
+
+@njit(cache=True)
+def subray_pixel(i, j, a, b, k, rc, eps, dom, size):
+    '''
+    Finds the source pixel sampled by sub-pixel ray (a, b), of k x k rays
+    spread evenly over lensed pixel (i, j)
+    
+    Returns:
+    --------------
+    index_1, index_2 - source pixel indices, both -1 if the ray leaves
+    the source plane
+    '''
+    p_width = 2*dom/(size)
+    r1 = 2*dom*i/(size) - dom + (a + 0.5)*p_width/k
+    r2 = 2*dom*j/(size) - dom + (b + 0.5)*p_width/k
+    t1, t2 = ray_position(r1, r2, rc, eps, dom, p_width)
+    
+    # rays off the source plane sample nothing, no wrapping around here
+    if not (t1 >= 0 and t1 < size and t2 >= 0 and t2 < size):
+        return -1, -1
+    return int(t1), int(t2)
+
+
+@njit(cache=True)
+def _floor_index(t):
+    '''
+    Floor of t as an integer, giving the most negative integer for nan or
+    inf, as numpy does when casting them
+    '''
+    if np.isfinite(t):
+        return int(np.floor(t))
+    return np.iinfo(np.int64).min
+
+
+@njit(cache=True)
+def source_pixel(i, j, rc, eps, dom, size):
+    '''
+    Finds the source pixel sampled by lensed pixel (i, j), following the same
+    floating point operations as map_indices, with negative indices wrapped
+    as numpy indexing does.
+    
+    Returns:
+    --------------
+    index_1, index_2 - source pixel indices, both -1 if the ray could not
+    index the source image
+    '''
+    t1, t2 = source_position(i, j, rc, eps, dom, size)
+    index_1 = _floor_index(t1)
+    index_2 = _floor_index(t2)
+    
+    # wrap negative indices
+    if index_1 < 0:
+        index_1 += size
+    if index_2 < 0:
+        index_2 += size
+    
+    if index_1 < 0 or index_1 >= size or index_2 < 0 or index_2 >= size:
+        return -1, -1
+    return index_1, index_2
+
+
+@njit(cache=True)
+def _far_from_edge(t):
+    frac = t - np.floor(t)
+    return frac > EDGE_TOL and frac < 1 - EDGE_TOL
+
+
+@njit(cache=True)
+def _set_direct(i, j, rc, eps, dom, index_1, index_2):
+    '''
+    Evaluates the lens equation for pixel (i, j) and its reflections about
+    both axes, setting their source pixel indices
+    '''
+    size = index_1.shape[0]
+    i, j = np.int64(i), np.int64(j)  # prange gives unsigned indices
+    for n in range(4):
+        if n < 2:
+            i_r = i
+        else:
+            i_r = size - 1 - i
+        if n % 2 == 0:
+            j_r = j
+        else:
+            j_r = size - 1 - j
+        t1, t2 = source_position(i_r, j_r, rc, eps, dom, size)
+        index_1[i_r, j_r] = _floor_index(t1)
+        index_2[i_r, j_r] = _floor_index(t2)
+
+
+@njit(cache=True)
+def _set_reflected(i, j, k1, k2, index_1, index_2):
+    '''
+    Sets the source pixel indices (k1, k2) of pixel (i, j) and those of its
+    reflections about both axes, reflecting pixel index k to N-1-k
+    '''
+    size = index_1.shape[0]
+    i, j = np.int64(i), np.int64(j)  # prange gives unsigned indices
+    i_m, j_m = size - 1 - i, size - 1 - j
+    
+    # for the middle row and column of odd sizes the reflection is the
+    # pixel itself, so write the pixel after its reflections
+    index_1[i_m, j_m], index_2[i_m, j_m] = size - 1 - k1, size - 1 - k2
+    index_1[i_m, j], index_2[i_m, j] = size - 1 - k1, k2
+    index_1[i, j_m], index_2[i, j_m] = k1, size - 1 - k2
+    index_1[i, j], index_2[i, j] = k1, k2
+
+
+# lens map from one quadrant by reflection, parallel over rows
+@njit(parallel=True, cache=True)
+def _quadrant_map_kernel(rc, eps, dom, index_1, index_2, unsure, upper_only):
+    '''
+    Fills index_1 and index_2 as map_indices would, evaluating the lens
+    equation for pixel (i, j) of the first quadrant, i, j < (N+1)//2, and
+    reflecting it about both axes. For upper_only, only pixels with j >= i
+    are done. Pixels whose position is too close to a pixel edge to trust
+    reflection are evaluated directly, and flagged in unsure.
+    Each pixel is only written from its own reflection in the quadrant,
+    so rows can be run in parallel.
+    '''
+    size = index_1.shape[0]
+    half = (size + 1)//2
+    
+    for i in prange(half):
+        if upper_only:
+            j_start = i
+        else:
+            j_start = 0
+        
+        for j in range(j_start, half):
+            t1, t2 = source_position(i, j, rc, eps, dom, size)
+            if _far_from_edge(t1) and _far_from_edge(t2):
+                _set_reflected(i, j, int(np.floor(t1)), int(np.floor(t2)), index_1, index_2)
+            else:
+                unsure[i, j] = True
+                _set_direct(i, j, rc, eps, dom, index_1, index_2)
+
+
+# lower triangle of the quadrant from the upper one, for axisymmetric lenses
+@njit(parallel=True, cache=True)
+def _transpose_map_kernel(rc, eps, dom, index_1, index_2, unsure):
+    '''
+    Fills pixels (i, j), j < i, of the first quadrant and their reflections,
+    by swapping the axes of pixel (j, i), valid for eps=0 only
+    '''
+    size = index_1.shape[0]
+    half = (size + 1)//2
+    
+    for i in prange(half):
+        for j in range(i):
+            if unsure[j, i]:
+                _set_direct(i, j, rc, eps, dom, index_1, index_2)
+            else:
+                _set_reflected(i, j, index_2[j, i], index_1[j, i], index_1, index_2)
+
+
+# fused lens equation and gather, parallel over rows of the lensed image
+@njit(parallel=True, cache=True)
+def _lens_kernel(image_s, rc, eps, dom, image_l, bad_rows):
+    '''
+    Lenses image_s into image_l, computing the lens equation and copying the
+    source pixel for each lensed pixel in one pass. Follows the same floating
+    point operations as map_indices. Rows where a ray could not index the
+    source image are flagged in bad_rows.
+    '''
+    size = image_s.shape[0]
+    
+    for i in prange(size):
+        for j in range(size):
+            index_1, index_2 = source_pixel(i, j, rc, eps, dom, size)
+            if index_1 < 0:
+                bad_rows[i] = True
+                image_l[i, j, :] = 0
+            else:
+                image_l[i, j, :] = image_s[index_1, index_2, :]
+
+
+# sum of lensed pixel values, parallel over fixed blocks of rows
+@njit(parallel=True, cache=True)
+def _flux_kernel(image_s, rc, eps, dom, block_sums, bad_blocks):
+    '''
+    Sums the source pixel values sampled by each lensed pixel, for each
+    colour channel, into block_sums of each block of rows. Blocks where a ray
+    could not index the source image are flagged in bad_blocks.
+    '''
+    size = image_s.shape[0]
+    n_blocks = len(block_sums)
+    
+    for b in prange(n_blocks):
+        for i in range(b*size // n_blocks, (b+1)*size // n_blocks):
+            for j in range(size):
+                index_1, index_2 = source_pixel(i, j, rc, eps, dom, size)
+                if index_1 < 0:
+                    bad_blocks[b] = True
+                else:
+                    for c in range(image_s.shape[2]):
+                        block_sums[b, c] += image_s[index_1, index_2, c]
+
+
+# copy of source pixels at the indices of a map, parallel over pixels
+@njit(parallel=True, cache=True)
+def _gather_kernel(image_flat, flat, image_l):
+    for n in prange(len(flat)):
+        for c in range(image_flat.shape[1]):
+            image_l[n, c] = image_flat[flat[n], c]
+
+
+# copy of RGB source pixels at the indices of a map, with the 3 channels
+# unrolled, parallel over pixels
+@njit(parallel=True, cache=True)
+def _gather_rgb_kernel(image_flat, flat, image_l):
+    for n in prange(len(flat)):
+        k = flat[n]
+        image_l[n, 0] = image_flat[k, 0]
+        image_l[n, 1] = image_flat[k, 1]
+        image_l[n, 2] = image_flat[k, 2]
+
+
+# copy of packed pixels at the indices of a map, parallel over rows
+@njit(parallel=True, cache=True)
+def _packed_gather_kernel(packed, flat, packed_l):
+    for i in prange(flat.shape[0]):
+        for j in range(flat.shape[1]):
+            packed_l[i, j] = packed[flat[i, j]]
+
+
+# packing of uint8 RGB pixels into the low 3 bytes of uint32, parallel over rows
+@njit(parallel=True, cache=True)
+def _pack_kernel(image_s, packed):
+    for i in prange(image_s.shape[0]):
+        for j in range(image_s.shape[1]):
+            packed[i, j] = np.uint32(image_s[i, j, 0]) | (np.uint32(image_s[i, j, 1]) << 8) | (np.uint32(image_s[i, j, 2]) << 16)
+
+
+# unpacking of uint32 pixels into uint8 RGB, parallel over rows
+@njit(parallel=True, cache=True)
+def _unpack_kernel(packed, image_l):
+    for i in prange(packed.shape[0]):
+        for j in range(packed.shape[1]):
+            v = packed[i, j]
+            image_l[i, j, 0] = v & 255
+            image_l[i, j, 1] = (v >> 8) & 255
+            image_l[i, j, 2] = (v >> 16) & 255
+
+
+# sum of source pixel values at the indices of a map, parallel over blocks
+@njit(parallel=True, cache=True)
+def _flux_gather_kernel(image_flat, flat, block_sums):
+    n_pix = len(flat)
+    n_blocks = len(block_sums)
+    for b in prange(n_blocks):
+        for n in range(b*n_pix // n_blocks, (b+1)*n_pix // n_blocks):
+            for c in range(image_flat.shape[1]):
+                block_sums[b, c] += image_flat[flat[n], c]
+
+
+# average over k x k sub-pixel rays for each lensed pixel, parallel over rows
+@njit(parallel=True, cache=True)
+def _supersample_kernel(image_s, rc, eps, dom, k, image_l):
+    size = image_s.shape[0]
+    n_chan = image_s.shape[2]
+    for i in prange(size):
+        total = np.zeros(n_chan)
+        for j in range(size):
+            total[:] = 0
+            for a in range(k):
+                for b in range(k):
+                    index_1, index_2 = subray_pixel(i, j, a, b, k, rc, eps, dom, size)
+                    if index_1 >= 0:
+                        for c in range(n_chan):
+                            total[c] += image_s[index_1, index_2, c]
+            for c in range(n_chan):
+                image_l[i, j, c] = total[c]/k**2
+
+
+# flux of supersampled lensed image, parallel over fixed blocks of rows
+@njit(parallel=True, cache=True)
+def _supersample_flux_kernel(image_s, rc, eps, dom, k, block_sums):
+    size = image_s.shape[0]
+    n_blocks = len(block_sums)
+    for n in prange(n_blocks):
+        for i in range(n*size // n_blocks, (n+1)*size // n_blocks):
+            for j in range(size):
+                for a in range(k):
+                    for b in range(k):
+                        index_1, index_2 = subray_pixel(i, j, a, b, k, rc, eps, dom, size)
+                        if index_1 >= 0:
+                            for c in range(image_s.shape[2]):
+                                block_sums[n, c] += image_s[index_1, index_2, c]
+    block_sums /= k**2
+
+
+# source pixel labels of one sub-pixel ray per lensed pixel, parallel over rows
+@njit(parallel=True, cache=True)
+def _subray_ids_kernel(rc, eps, dom, a, b, k, ids):
+    size = ids.shape[0]
+    for i in prange(size):
+        for j in range(size):
+            index_1, index_2 = subray_pixel(i, j, a, b, k, rc, eps, dom, size)
+            if index_1 >= 0:
+                ids[i, j] = index_1*size + index_2
+            else:
+                ids[i, j] = -1
+
+
+@njit(cache=True)
+def _interp_weight(x, mode):
+    '''
+    Weight of a source pixel centre at distance x (in pixels) from the
+    sampled position, for bilinear (1), bicubic (2, Keys with a=-0.5)
+    or Lanczos-3 (3) interpolation
+    '''
+    x = abs(x)
+    if mode == 1:
+        if x < 1:
+            return 1 - x
+        return 0.0
+    elif mode == 2:
+        if x < 1:
+            return 1.5*x**3 - 2.5*x**2 + 1
+        elif x < 2:
+            return -0.5*x**3 + 2.5*x**2 - 4*x + 2
+        return 0.0
+    else:
+        if x == 0:
+            return 1.0
+        elif x < 3:
+            return 3*np.sin(np.pi*x)*np.sin(np.pi*x/3)/(np.pi*x)**2
+        return 0.0
+
+
+# lens with interpolated sampling of the source, parallel over rows
+@njit(parallel=True, cache=True)
+def _interp_kernel(image_s, rc, eps, dom, mode, radius, boundary, image_l):
+    size = image_s.shape[0]
+    n_chan = image_s.shape[2]
+    p_width = 2*dom/(size)
+    for i in prange(size):
+        w_1 = np.zeros(2*radius)
+        w_2 = np.zeros(2*radius)
+        for j in range(size):
+            image_l[i, j, :] = 0
+            
+            # position relative to source pixel centres
+            t1, t2 = source_position(i, j, rc, eps, dom, size)
+            u1, u2 = t1 - 0.5, t2 - 0.5
+            if not (np.isfinite(u1) and np.isfinite(u2)):
+                continue
+            
+            # weights of the neighbouring source pixels along each axis
+            base_1, base_2 = int(np.floor(u1)), int(np.floor(u2))
+            for m in range(2*radius):
+                w_1[m] = _interp_weight(u1 - (base_1 - radius + 1 + m), mode)
+                w_2[m] = _interp_weight(u2 - (base_2 - radius + 1 + m), mode)
+            
+            # lanczos weights do not add up to one by themselves
+            if mode == 3:
+                w_1 /= np.sum(w_1)
+                w_2 /= np.sum(w_2)
+            
+            for m in range(2*radius):
+                index_1 = base_1 - radius + 1 + m
+                if index_1 < 0 or index_1 >= size:
+                    if boundary == 0:
+                        continue
+                    index_1 = min(max(index_1, 0), size - 1)
+                for n in range(2*radius):
+                    index_2 = base_2 - radius + 1 + n
+                    if index_2 < 0 or index_2 >= size:
+                        if boundary == 0:
+                            continue
+                        index_2 = min(max(index_2, 0), size - 1)
+                    for c in range(n_chan):
+                        image_l[i, j, c] += w_1[m]*w_2[n]*image_s[index_1, index_2, c]
+
+
+# maps returned by get_map ahead of the cache, by key, see pin_map
+_pinned_maps = {}
+
+
+def _build_map(size, rc, eps, dom, precision):
+    return LensMap(size, rc, eps, dom, precision)
+
+
+_cached_map = functools.lru_cache(maxsize=MAP_CACHE_SIZE)(_build_map)
+
+
+def get_map(size, rc, eps, dom=1, precision=None):
+    '''
+    Returns the LensMap for the given parameters, building it only if it is
+    not already held in the least recently used cache
+    
+    Parameters:
+    --------------
+    - number of pixels per side of the square image, size (int)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    kwargs:
+    --------------
+    precision - 'float64' or 'float32', default=None uses the global
+                PRECISION, see set_precision
+    
+    Returns:
+    --------------
+    LensMap instance
+    '''
+    
+    if precision is None:
+        precision = PRECISION
+    elif precision not in ('float64', 'float32'):
+        raise ValueError('precision must be \'float64\' or \'float32\'')
+    
+    # normalise the key, so that eg. rc=0 and rc=0.0 share the same map
+    key = (int(size), float(rc), float(eps), float(dom), precision)
+    
+    # use maps pinned in this process first, eg. ones in shared memory
+    if key in _pinned_maps:
+        return _pinned_maps[key]
+    return _cached_map(*key)
+
+
+def _map_key(lens_map):
+    '''
+    Normalised key of a LensMap, as used by get_map
+    '''
+    return (int(lens_map.size), float(lens_map.rc), float(lens_map.eps), float(lens_map.dom), lens_map.precision)
+
+
+def pin_map(lens_map):
+    '''
+    Makes get_map, and so lens etc., return the given LensMap for its
+    parameters in this process, regardless of the cache, until unpinned.
+    Used to share maps between processes, see shared_maps.
+    '''
+    _pinned_maps[_map_key(lens_map)] = lens_map
+
+
+def unpin_map(lens_map):
+    '''
+    Stops get_map returning the given pinned LensMap
+    '''
+    _pinned_maps.pop(_map_key(lens_map), None)
+
+
+def clear_map_cache():
+    '''
+    Empties the cache of lens maps, freeing their memory, pinned maps stay
+    '''
+    _cached_map.cache_clear()
+
+
+def set_cache_size(size):
+    '''
+    Sets the number of lens maps kept in memory, emptying the cache
+    
+    Parameters:
+    --------------
+    size - maximum number of maps cached, None for no limit
+    '''
+    global MAP_CACHE_SIZE, _cached_map
+    MAP_CACHE_SIZE = None if size is None else int(size)
+    _cached_map.cache_clear()
+    _cached_map = functools.lru_cache(maxsize=MAP_CACHE_SIZE)(_build_map)
+
+
+def lens_source_ids(size, rc, eps, dom=1, precision=None):
+    '''
+    Lenses a map of source pixel labels, giving the provenance of each
+    lensed image pixel as a single integer instead of unique RGB markers
+    
+    Parameters:
+    --------------
+    - number of pixels per side of the square image, size (int)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    kwargs:
+    --------------
+    precision - 'float64' or 'float32', default=None uses the global
+                PRECISION, see set_precision
+    
+    Returns:
+    --------------
+    (N x N) int32 (or int64 for very large N) array of flattened source
+    pixel indices (row*N + col), -1 where rays leave the source plane.
+    Shared with the cache, so read only, copy it to modify it.
+    '''
+    
+    return get_map(size, rc, eps, dom, precision).source_ids
+
+
+def pack_rgb(image_s, out=None):
+    '''
+    Packs an RGB image into one uint32 per pixel, for LensMap.lens_packed
+    
+    Parameters:
+    --------------
+    image_s - (N x M x 3) uint8 image
+    
+    kwargs:
+    --------------
+    out - (N x M) uint32 array to pack into, default=None creates a new one
+    
+    Returns:
+    --------------
+    (N x M) uint32 array, with R, G, B in the lowest 3 bytes
+    '''
+    if np.ndim(image_s) != 3 or np.shape(image_s)[2] != 3 or image_s.dtype != np.uint8:
+        raise TypeError('Only uint8 RGB images can be packed')
+    if out is None:
+        out = np.empty(np.shape(image_s)[:2], dtype=np.uint32)
+    _pack_kernel(image_s, out)
+    return out
+
+
+def unpack_rgb(packed, out=None):
+    '''
+    Unpacks an image packed by pack_rgb back into uint8 RGB
+    
+    Parameters:
+    --------------
+    packed - (N x M) uint32 packed image
+    
+    kwargs:
+    --------------
+    out - (N x M x 3) uint8 array to unpack into, default=None creates a new one
+    
+    Returns:
+    --------------
+    (N x M x 3) uint8 RGB image
+    '''
+    if out is None:
+        out = np.empty(np.shape(packed) + (3,), dtype=np.uint8)
+    _unpack_kernel(packed, out)
+    return out
+
+
+def lens_fused(image_s, rc, eps, dom=1, out=None):
+    '''
+    Lenses the given image as lens() does, but with a compiled, parallel
+    kernel that computes the lens equation and copies the data for each
+    pixel in one pass, with no intermediate grids and no cached map.
+    Best for one-off lensing of large images.
+    
+    Parameters:
+    --------------
+    - square image as numpy array of values from 0 to 255 in RGB (N x N x 3)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    kwargs:
+    --------------
+    out - array of same shape and dtype as image_s to write the
+          lensed image into, default=None creates a new one
+    
+    Returns:
+    --------------
+    array of the lensed image (N x N x 3), of the same dtype as image_s
+    '''
+    
+    # check if the user gave a square image and get number of pixels per side
+    if len(image_s[:, 0, 0]) == len(image_s[0, :, 0]):
+        size = len(image_s)
+    else:
+        raise TypeError('Image must be square, can\'t broadcast with different shapes')
+    
+    out = _check_out(out, image_s)
+    
+    # lens straight into the output buffer
+    bad_rows = np.zeros(size, dtype=np.bool_)
+    _lens_kernel(image_s, float(rc), float(eps), float(dom), out, bad_rows)
+    if np.any(bad_rows):
+        raise IndexError('lens map samples outside of the source image of size ' + str(size))
+    
+    return out
+
+
+def subray_source_ids(size, rc, eps, dom, a, b, k):
+    '''
+    Labels the source pixel sampled by sub-pixel ray (a, b), of k x k rays
+    spread evenly over each lensed pixel, as lens_source_ids does for the
+    central rays. Used to accumulate supersampled maps one ray offset at
+    a time, without storing all (kN x kN) rays at once.
+    
+    Returns:
+    --------------
+    (N x N) int64 array of flattened source pixel indices (row*N + col),
+    -1 where rays leave the source plane
+    '''
+    ids = np.empty((size, size), dtype=np.int64)
+    _subray_ids_kernel(float(rc), float(eps), float(dom), a, b, k, ids)
+    return ids
+
+
+def lens_supersampled(image_s, rc, eps, dom=1, k=3, out=None):
+    '''
+    Lenses the given image firing k x k rays, spread evenly over each lensed
+    pixel, and averaging the source pixel values they sample, with a compiled,
+    parallel kernel, without storing the rays. Rays leaving the source plane
+    add nothing. Reduces the nearest pixel sampling error of lens() without
+    increasing the image size.
+    
+    Parameters:
+    --------------
+    - square image as numpy array of values from 0 to 255 in RGB (N x N x 3)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    kwargs:
+    --------------
+    k - number of rays per lensed pixel side, int, default=3
+    out - float array of same shape as image_s to write the lensed image
+          into, default=None creates a new one
+    
+    Returns:
+    --------------
+    array of the lensed image (N x N x 3), of floats
+    '''
+    
+    # check if the user gave a square image
+    if len(image_s[:, 0, 0]) != len(image_s[0, :, 0]):
+        raise TypeError('Image must be square, can\'t broadcast with different shapes')
+    
+    if out is None:
+        out = np.empty(np.shape(image_s))
+    elif np.shape(out) != np.shape(image_s) or out.dtype != float:
+        raise TypeError('out must be a float array of the same shape as the image')
+    
+    _supersample_kernel(image_s, float(rc), float(eps), float(dom), int(k), out)
+    return out
+
+
+def lens_interpolated(image_s, rc, eps, dom=1, interp='bilinear', boundary='zero', out=None):
+    '''
+    Lenses the given image, interpolating the source image at the position
+    each ray lands on, rather than taking the pixel it lands in, with
+    a compiled, parallel kernel.
+    
+    Parameters:
+    --------------
+    - square image as numpy array of values from 0 to 255 in RGB (N x N x 3)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    kwargs:
+    --------------
+    interp - interpolation, 'bilinear' (default), 'bicubic' or 'lanczos' (3)
+    boundary - value of source pixels beyond the image edge, 'zero' (default)
+               or 'clamp' to the nearest edge pixel
+    out - float array of same shape as image_s to write the lensed image
+          into, default=None creates a new one
+    
+    Returns:
+    --------------
+    array of the lensed image (N x N x 3), of floats. NB. bicubic and lanczos
+    can overshoot the range of the source values near sharp edges
+    '''
+    
+    # check if the user gave a square image
+    if len(image_s[:, 0, 0]) != len(image_s[0, :, 0]):
+        raise TypeError('Image must be square, can\'t broadcast with different shapes')
+    if interp not in INTERP_MODES:
+        raise ValueError('interp must be one of ' + ', '.join(INTERP_MODES))
+    if boundary not in BOUNDARY_MODES:
+        raise ValueError('boundary must be one of ' + ', '.join(BOUNDARY_MODES))
+    
+    if out is None:
+        out = np.empty(np.shape(image_s))
+    elif np.shape(out) != np.shape(image_s) or out.dtype != float:
+        raise TypeError('out must be a float array of the same shape as the image')
+    
+    mode, radius = INTERP_MODES[interp]
+    _interp_kernel(image_s, float(rc), float(eps), float(dom), mode, radius, BOUNDARY_MODES[boundary], out)
+    return out
+
+
+def lens_flux(image_s, rc, eps, dom=1, supersample=1):
+    '''
+    Finds the total flux of the lensed image in each colour channel, as
+    np.sum(lens(image_s, rc, eps, dom), axis=(0, 1)), streaming through the
+    rays with a compiled, parallel kernel, such that the lensed image is
+    never stored. Results are the same for any number of threads.
+    
+    Parameters:
+    --------------
+    - square image as numpy array of values from 0 to 255 in RGB (N x N x 3)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    kwargs:
+    --------------
+    supersample - number of rays per lensed pixel side, default=1, for k > 1
+                  gives the flux of lens_supersampled(image_s, ..., k)
+    
+    Returns:
+    --------------
+    array of summed pixel values in each channel of the lensed image (3)
+    '''
+    
+    # check if the user gave a square image and get number of pixels per side
+    if len(image_s[:, 0, 0]) == len(image_s[0, :, 0]):
+        size = len(image_s)
+    else:
+        raise TypeError('Image must be square, can\'t broadcast with different shapes')
+    
+    # sum each block of rows, then add up the blocks in order
+    block_sums = np.zeros((min(FLUX_BLOCKS, size), np.shape(image_s)[2]))
+    if supersample > 1:
+        _supersample_flux_kernel(image_s, float(rc), float(eps), float(dom), int(supersample), block_sums)
+        return np.sum(block_sums, axis=0)
+    
+    bad_blocks = np.zeros(len(block_sums), dtype=np.bool_)
+    _flux_kernel(image_s, float(rc), float(eps), float(dom), block_sums, bad_blocks)
+    if np.any(bad_blocks):
+        raise IndexError('lens map samples outside of the source image of size ' + str(size))
+    
+    return np.sum(block_sums, axis=0)
 
 
+def lens(image_s, rc, eps, dom=1, out=None, supersample=1, interp='nearest', boundary='zero', precision=None):
+    '''
+    Lenses the given image for a planar, transparent, symmetric lensing object
+    positioned at the centre of the image
+    
+    Parameters:
+    --------------
+    - square image as numpy array of values from 0 to 255 in RGB (N x N x 3)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    kwargs:
+    --------------
+    out - array of same shape and dtype as image_s to write the
+          lensed image into, default=None creates a new one
+    
+    Returns:
+    --------------
+    array of the lensed image (N x N x 3), of the same dtype as image_s,
+    eg. uint8 images, as read in from jpg, stay uint8
+    
+    A stack of frames (T x N x N x 3) may also be given, which are all lensed
+    by one gather, see LensMap.lens_stack, giving (T x N x N x 3) array.
+    
+    For supersample=k > 1, k x k rays are averaged per lensed pixel, see
+    lens_supersampled, giving an array of floats (out must be floats too).
+    
+    For interp other than 'nearest' ('bilinear', 'bicubic', 'lanczos') the
+    source is interpolated where each ray lands, with edges set by boundary
+    ('zero' or 'clamp'), see lens_interpolated, giving an array of floats.
+    
+    precision ('float64' or 'float32') selects the lens map precision, for
+    nearest pixel sampling, default=None uses the global PRECISION.
+    
+    A (N x N) uint32 image packed by pack_rgb is lensed with
+    LensMap.lens_packed, giving a packed (N x N) array.
+    '''
+    
+    # sample source by interpolation, on each frame of stacks
+    if interp != 'nearest':
+        if supersample > 1:
+            raise ValueError('supersampling is only done with nearest pixel sampling')
+        if np.ndim(image_s) == 4:
+            if out is None:
+                out = np.empty(np.shape(image_s))
+            for t in range(len(image_s)):
+                lens_interpolated(image_s[t], rc, eps, dom, interp, boundary, out=out[t])
+            return out
+        return lens_interpolated(image_s, rc, eps, dom, interp, boundary, out=out)
+    
+    # average over sub-pixel rays, streaming without a map
+    if supersample > 1:
+        if np.ndim(image_s) == 4:
+            if out is None:
+                out = np.empty(np.shape(image_s))
+            for t in range(len(image_s)):
+                lens_supersampled(image_s[t], rc, eps, dom, supersample, out=out[t])
+            return out
+        return lens_supersampled(image_s, rc, eps, dom, supersample, out=out)
+    
+    # lens images kept packed, one uint32 per pixel
+    if np.ndim(image_s) == 2 and image_s.dtype == np.uint32:
+        lens_map = get_map(len(image_s), rc, eps, dom, precision)
+        return lens_map.lens_packed(image_s, out=out)
+    
+    # lens stacks of frames together, with the map shared by all
+    if np.ndim(image_s) == 4:
+        lens_map = get_map(np.shape(image_s)[1], rc, eps, dom, precision)
+        return lens_map.lens_stack(image_s, out=out)
+    
+    # check if the user gave a square image and get number of pixels per side
+    if len(image_s[:, 0, 0]) == len(image_s[0, :, 0]):
+        size = len(image_s)
+    else:
+        raise TypeError('Image must be square, can\'t broadcast with different shapes')
+    
+    # get the (cached) map of source pixels for these parameters
+    lens_map = get_map(size, rc, eps, dom, precision)
+    
+    # copy the data from source image over with it, for mostly empty sources
+    # only move the nonzero pixels, using the inverse map
+    if np.count_nonzero(image_s) < SPARSE_FRACTION*np.size(image_s):
+        image_l = lens_map.lens_sparse(image_s, out=out)
+    else:
+        image_l = lens_map.lens(image_s, out=out)
+    
+    # return the image to the suer
+    return image_l
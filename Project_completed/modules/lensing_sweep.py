@@ -0,0 +1,119 @@
+'''
+
+define functions to lens one source image for many lens parameters at once,
+for parameter studies over rc and eps
+
+@author: Maciej Tomasz Jarema ppymj11
+
+'''
+
+# import modules
+import numpy as np
+from numba import njit, prange
+import Project_completed.modules.lensing_function as lensing
+
+# %%
+
+
+# lens the same source for each set of parameters, parallel over parameters.
+# Kernels here are not cached, as they compile in lensing.source_pixel, whose
+# changes numba's cache would not see, it only checks this file
+@njit(parallel=True)
+def _sweep_kernel(image_s, rc, eps, dom, images_l, bad):
+    size = image_s.shape[0]
+    for p in prange(len(rc)):
+        for i in range(size):
+            for j in range(size):
+                index_1, index_2 = lensing.source_pixel(i, j, rc[p], eps[p], dom, size)
+                if index_1 < 0:
+                    bad[p] = True
+                    images_l[p, i, j, :] = 0
+                else:
+                    images_l[p, i, j, :] = image_s[index_1, index_2, :]
+
+
+# sum the lensed flux for each set of parameters, without storing the images
+@njit(parallel=True)
+def _sweep_flux_kernel(image_s, rc, eps, dom, flux, bad):
+    size = image_s.shape[0]
+    for p in prange(len(rc)):
+        for i in range(size):
+            for j in range(size):
+                index_1, index_2 = lensing.source_pixel(i, j, rc[p], eps[p], dom, size)
+                if index_1 < 0:
+                    bad[p] = True
+                else:
+                    for c in range(image_s.shape[2]):
+                        flux[p, c] += image_s[index_1, index_2, c]
+
+
+def _sweep_params(image_s, rc, eps):
+    '''
+    Checks the source image and broadcasts rc and eps against each other,
+    returning them as flat float arrays
+    '''
+    if np.ndim(image_s) != 3 or len(image_s[:, 0, 0]) != len(image_s[0, :, 0]):
+        raise TypeError('Image must be square, can\'t broadcast with different shapes')
+    
+    rc, eps = np.broadcast_arrays(np.asarray(rc, dtype=float), np.asarray(eps, dtype=float))
+    return np.ascontiguousarray(rc.ravel()), np.ascontiguousarray(eps.ravel())
+
+
+def sweep_images(image_s, rc, eps, dom=1):
+    '''
+    Lenses the given image for each pair of lens parameters, in parallel,
+    giving the same images as lensing_function.lens does for each
+    
+    Parameters:
+    --------------
+    - square image as numpy array of values from 0 to 255 in RGB (N x N x 3)
+    - central core radii rc (float or array)
+    - ellipticities eps (float or array), broadcast against rc
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    Returns:
+    --------------
+    (P x N x N x 3) array of lensed images, for the P broadcast parameter
+    pairs in order, of the same dtype as image_s
+    '''
+    
+    rc, eps = _sweep_params(image_s, rc, eps)
+    
+    # lens into one stack of images
+    images_l = np.empty((len(rc),) + np.shape(image_s), dtype=image_s.dtype)
+    bad = np.zeros(len(rc), dtype=np.bool_)
+    _sweep_kernel(image_s, rc, eps, float(dom), images_l, bad)
+    if np.any(bad):
+        raise IndexError('lens map samples outside of the source image for rc=' + str(rc[bad][0]) + ', eps=' + str(eps[bad][0]))
+    
+    return images_l
+
+
+def sweep_flux(image_s, rc, eps, dom=1):
+    '''
+    Finds the total lensed flux in each colour channel for each pair of lens
+    parameters, in parallel, without storing any lensed images
+    
+    Parameters:
+    --------------
+    - square image as numpy array of values from 0 to 255 in RGB (N x N x 3)
+    - central core radii rc (float or array)
+    - ellipticities eps (float or array), broadcast against rc
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    Returns:
+    --------------
+    (P x 3) array of summed pixel values in each channel of the lensed image,
+    for the P broadcast parameter pairs in order
+    '''
+    
+    rc, eps = _sweep_params(image_s, rc, eps)
+    
+    # sum over each lensed image
+    flux = np.zeros((len(rc), np.shape(image_s)[2]))
+    bad = np.zeros(len(rc), dtype=np.bool_)
+    _sweep_flux_kernel(image_s, rc, eps, float(dom), flux, bad)
+    if np.any(bad):
+        raise IndexError('lens map samples outside of the source image for rc=' + str(rc[bad][0]) + ', eps=' + str(eps[bad][0]))
+    
+    return flux
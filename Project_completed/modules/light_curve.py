@@ -0,0 +1,119 @@
+'''
+
+define functions to find light curves of bodies drawn as pixelated discs
+on the source, lensed or not, without drawing or lensing any frames. As the
+lensed flux is linear in the source, it is a sum over the pixels of the
+bodies of their colour, weighted by how many lensed pixels sample them
+
+@author: Maciej Tomasz Jarema ppymj11
+
+'''
+
+# import modules
+import numpy as np
+from numba import njit, prange
+import Project_completed.modules.lensing_function as lensing
+
+# %%
+
+
+def flux_weights(size, rc, eps, dom=1):
+    '''
+    Finds the weight of each source pixel in the total flux of the lensed
+    image, as the number of lensed pixels that copy it in lensing_function.lens
+    (inc. wrapped around indices), such that
+    sum(lens(image_s)) = sum(weights * image_s) for any image
+    
+    Parameters:
+    --------------
+    - number of pixels per side of the square image, size (int)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    Returns:
+    --------------
+    (N x N) array of weights, indexed as the source image
+    '''
+    flat = lensing.get_map(size, rc, eps, dom).flat
+    return np.bincount(flat.ravel(), minlength=size*size).reshape(size, size).astype(float)
+
+
+# summed colour of the discs in each frame, weighted by pixel, drawn in order
+# such that later discs cover earlier ones, as by draw_pixels.draw_sphere,
+# parallel over time steps
+@njit(parallel=True, cache=True)
+def _disc_flux_kernel(weights, rows, columns, radii, colours, drawn, fluxes):
+    size = weights.shape[0]
+    n_bodies = len(radii)
+    for t in prange(rows.shape[0]):
+        for k in range(n_bodies):
+            if not drawn[t, k]:
+                continue
+            body_size = radii[k]
+            
+            # loop over the square around the body, as draw_sphere does
+            for i in range(2*body_size+1):
+                x = -body_size + i
+                ind_1 = rows[t, k] - body_size + i
+                for j in range(2*body_size+1):
+                    y = -body_size + j
+                    ind_2 = columns[t, k] - body_size + j
+                    if ((x/body_size)**2 + (y/body_size)**2) <= 1 and (ind_1 >= 0 and ind_1 < size) and (ind_2 >= 0 and ind_2 < size):
+                        
+                        # skip pixels drawn over by a later body
+                        covered = False
+                        for m in range(k+1, n_bodies):
+                            if drawn[t, m]:
+                                x_m = (ind_1 - rows[t, m])/radii[m]
+                                y_m = (ind_2 - columns[t, m])/radii[m]
+                                if x_m**2 + y_m**2 <= 1:
+                                    covered = True
+                                    break
+                        
+                        if not covered:
+                            for c in range(colours.shape[1]):
+                                fluxes[t, c] += colours[k, c]*weights[ind_1, ind_2]
+
+
+def disc_light_curve(weights, columns, radii, colours, drawn=None, rows=None):
+    '''
+    Finds the light curve of bodies drawn as discs, as by
+    draw_pixels.draw_sphere, giving the same as drawing each frame on an empty
+    source, lensing it, and summing it, but only visiting the pixels of the
+    bodies, with the lens reduced to flux_weights computed once
+    
+    Parameters:
+    --------------
+    weights - (N x N) array of source pixel weights, from flux_weights, or
+              np.ones((N, N)) for the light curve without lensing
+    columns - (T x B) integer array of column index of the centre of each of
+              B bodies, in each of T frames
+    radii - (B) integer array of radii of the bodies, in pixels
+    colours - (B x 3) array of RGB colours of the bodies
+    
+    kwargs:
+    --------------
+    drawn - (T x B) boolean array of which bodies are drawn in each frame,
+            default=None draws all. Bodies are drawn in order, later ones
+            covering earlier ones.
+    rows - (T x B) integer array of row indices of the centres, default=None
+           puts them half way up, as draw_sphere does
+    
+    Returns:
+    --------------
+    (T x 3) array of summed RGB values of each (lensed) frame
+    '''
+    
+    columns = np.atleast_2d(np.asarray(columns, dtype=np.int64))
+    radii = np.asarray(radii, dtype=np.int64)
+    colours = np.asarray(colours, dtype=float).reshape(len(radii), -1)
+    if drawn is None:
+        drawn = np.ones(columns.shape, dtype=np.bool_)
+    if rows is None:
+        rows = np.full(columns.shape, int(len(weights)/2), dtype=np.int64)
+    
+    fluxes = np.zeros((len(columns), colours.shape[1]))
+    _disc_flux_kernel(np.asarray(weights, dtype=float), np.asarray(rows, dtype=np.int64), columns,
+                      radii, colours, np.asarray(drawn, dtype=np.bool_), fluxes)
+    return fluxes
@@ -0,0 +1,59 @@
+'''
+
+define functions to find magnification maps of the lens, by counting how
+many lensed image pixels sample each source pixel
+
+@author: Maciej Tomasz Jarema ppymj11
+
+'''
+
+# import modules
+import numpy as np
+import Project_completed.modules.lensing_function as lensing
+
+# %%
+
+
+def mag_map(size, rc, eps, dom=1, supersample=1):
+    '''
+    Finds the magnification map by histogramming the source pixel that each
+    lensed image pixel samples. Works in O(N^2) and for any size,
+    replacing the RGB marking and searching of mark_and_search_rgb
+    
+    Parameters:
+    --------------
+    - number of pixels per side of the square image, size (int)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    kwargs:
+    --------------
+    supersample - number of rays per lensed pixel side, int, default=1.
+                  For k > 1, k x k rays are fired through each lensed pixel,
+                  each counting 1/k^2, one ray offset at a time
+    
+    Returns:
+    --------------
+    (N x N) integer array of number of lensed pixels sampling each
+    source pixel, indexed in the same way as the source image (floats
+    for supersample > 1). Rays that leave the source plane are not counted.
+    '''
+    
+    # accumulate counts of each sub-pixel ray offset, never storing all rays
+    if supersample > 1:
+        counts = np.zeros(size*size)
+        for a in range(supersample):
+            for b in range(supersample):
+                ids = lensing.subray_source_ids(size, rc, eps, dom, a, b, supersample)
+                counts += np.bincount(ids[ids >= 0], minlength=size*size)
+        return counts.reshape(size, size)/supersample**2
+    
+    # get the source pixel labels of each lensed pixel, -1 left the plane
+    ids = lensing.lens_source_ids(size, rc, eps, dom)
+    
+    # count how many times each flattened source pixel is sampled
+    counts = np.bincount(ids[ids >= 0], minlength=size*size)
+    
+    # return as a map of the source plane
+    return counts.reshape(size, size)
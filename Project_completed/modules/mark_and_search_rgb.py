@@ -12,11 +12,24 @@ import numpy as np
 from numba import jit
 
 
-@jit(nopython=True)
 def rgb_track_mark(image_s):
     
+    # NB. R marker is not wrapped, so markers stay unique in float arrays
+    # for any size, lensing_function.lens_source_ids labels pixels with
+    # single integers instead. Integer images must fit the largest marker
+    size = len(image_s[:, 0, 0])
+    if np.issubdtype(image_s.dtype, np.integer):
+        max_mark = max(min(size*size - 1, 255), (size*size - 1)//256**2)
+        if max_mark > np.iinfo(image_s.dtype).max:
+            raise ValueError('image too big for unique marking in ' + str(image_s.dtype) + ', use a float image')
+    
+    return _rgb_track_mark(image_s)
+
+
+@jit(nopython=True)
+def _rgb_track_mark(image_s):
+    
     assert len(image_s[:, 0, 0]) == len(image_s[0, :, 0]), 'image must be square'
-    assert len(image_s[:, 0, 0]) < np.sqrt(256**3), 'Assert, image too big for uniquq marking'
     
     # get size of image
     size = len(image_s[:, 0, 0])
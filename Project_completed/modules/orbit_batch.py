@@ -0,0 +1,189 @@
+'''
+
+define functions to integrate the orbits of many systems of bodies at once,
+as one (K x 4N) state array on a shared time grid, instead of one odeint call
+per system, optionally split over a pool of processes
+
+@author: Maciej Tomasz Jarema ppymj11
+
+'''
+
+# import modules
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from numba import njit
+from scipy import integrate
+import Project_completed.modules.class_2body as bodies
+import Project_completed.modules.orbit_cache as orbit_cache
+
+# %%
+
+
+# derivatives of the states of K systems, flattened to one array for odeint,
+# each as class_2body System.jacobian_get. Not cached, as it compiles in
+# class_2body._nbody_derivs, whose changes numba's cache would not see
+@njit
+def _batch_derivs(y, masses, G):
+    n_sys = masses.shape[0]
+    n_state = len(y) // n_sys
+    derivs = np.empty_like(y)
+    for k in range(n_sys):
+        derivs[k*n_state:(k+1)*n_state] = bodies._nbody_derivs(y[k*n_state:(k+1)*n_state], masses[k], G)
+    return derivs
+
+
+# odeint right hand side of the flattened batch
+def _batch_rhs(y, t, masses):
+    return _batch_derivs(y, masses, bodies.G)
+
+
+def _tolerance(tol, n_state):
+    '''
+    Expands a tolerance given per system to one per component of the
+    flattened state, as odeint takes them, or keeps a single float
+    '''
+    if np.ndim(tol) == 0:
+        return tol
+    return np.repeat(tol, n_state)
+
+
+def _take(tol, index):
+    '''
+    Gets the tolerances of the systems at index, of a single float or
+    an array per system
+    '''
+    if np.ndim(tol) == 0:
+        return tol
+    return tol[index]
+
+
+def _solve_group(init, masses, t_arr, rtol, atol):
+    '''
+    Integrates a group of systems as one flattened state with odeint,
+    giving (K x T x 4N) states
+    '''
+    kwargs = {}
+    if rtol is not None:
+        kwargs['rtol'] = _tolerance(rtol, init.shape[1])
+    if atol is not None:
+        kwargs['atol'] = _tolerance(atol, init.shape[1])
+    solution = integrate.odeint(_batch_rhs, init.ravel(), t_arr, args=(masses,), **kwargs)
+    return solution.reshape(len(t_arr), len(init), -1).transpose(1, 0, 2)
+
+
+def system_states(systems):
+    '''
+    Gets the initial states and masses of a list of systems, from
+    class_2body system_def(...), after initials()
+    
+    Returns:
+    --------------
+    init - (K x 4N) array of initial states
+    masses - (K x N) array of masses
+    '''
+    init = np.array([np.asarray(system.init, dtype=float) for system in systems])
+    masses = np.array([[getattr(system, 'body' + str(n)).Mass for n in range(system.length)] for system in systems], dtype=float)
+    return init, masses
+
+
+def solve_batch(init, masses, t_arr, rtol=None, atol=None, processes=None):
+    '''
+    Integrates the orbits of K systems of N bodies each, with a shared time
+    grid, as one odeint call on all their states, with class_2body
+    jacobian_get for each system
+    
+    This is not a solver of each system to its own accuracy. All systems of
+    a group share one odeint call, so one sequence of steps and one error
+    control. rtol and atol may be given per system, weighting each one's
+    error, but the error of a system still depends on the others in its
+    group: results are only as accurate as the worst conditioned system of
+    the group allows, and change with the batch and its split (processes).
+    Eg. of 40 binaries at rtol=1e-10, one was 48 times further from its
+    Kepler solution than when solved alone. Solve systems one at a time
+    (or with orbit_cache) where each needs its own accuracy.
+    
+    Systems with the same motion up to a translation (and the same rtol and
+    atol), as keyed by orbit_cache.centre_state, are integrated once, from
+    the initial state of the first, and translated to the others.
+    
+    Parameters:
+    --------------
+    init - (K x 4N) array of initial states, ordered as by initials()
+    masses - (K x N) array of masses of the bodies of each system
+    t_arr - (T) array of times to get the states at
+    
+    kwargs:
+    --------------
+    rtol, atol - tolerances of odeint, default=None uses those of odeint,
+                 floats, or (K) arrays giving each system its own, applied
+                 to each of its components, see above for what they control
+    processes - number of processes to split the batch over, as that many
+                groups, default=None integrates it all in this process. The
+                processes are spawned, importing the calling script again,
+                so it must call this under an if __name__ == '__main__':
+                guard, else they fail with a RuntimeError.
+    
+    Returns:
+    --------------
+    (K x T x 4N) array of states, [k] being the states of system k, ordered
+    as the odeint solution
+    '''
+    init = np.asarray(init, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    t_arr = np.asarray(t_arr, dtype=float)
+    if np.ndim(rtol) > 0:
+        rtol = np.asarray(rtol, dtype=float)
+    if np.ndim(atol) > 0:
+        atol = np.asarray(atol, dtype=float)
+    
+    # integrate each distinct motion once, from the initial state of the
+    # first system with it, and translate that to the others sharing it
+    keys, shifts = [], []
+    for k in range(len(init)):
+        state_key, shift = orbit_cache.centre_state(init[k], masses[k])
+        tols = tuple(None if np.ndim(tol) == 0 else float(tol[k]) for tol in (rtol, atol))
+        keys.append(state_key + tols)
+        shifts.append(shift)
+    first = {}
+    for k, key in enumerate(keys):
+        first.setdefault(key, k)
+    unique = np.array(list(first.values()))
+    position = {key: i for i, key in enumerate(first)}
+    inverse = np.array([position[key] for key in keys])
+    
+    states = _solve_groups(init[unique], masses[unique], t_arr,
+                           _take(rtol, unique), _take(atol, unique), processes)
+    shifts = np.array(shifts)
+    return states[inverse] + (shifts - shifts[unique][inverse])[:, None, :]
+
+
+def _solve_groups(init, masses, t_arr, rtol, atol, processes):
+    '''
+    Integrates systems in one group, or split into groups over processes,
+    see solve_batch
+    '''
+    groups = [np.arange(len(init))]
+    if processes is not None:
+        groups = [index for index in np.array_split(groups[0], processes) if len(index)]
+    if len(groups) == 1:
+        return _solve_group(init, masses, t_arr, rtol, atol)
+    
+    # spawn processes, as numba's threads do not survive being forked
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(_solve_group, init[index], masses[index], t_arr, _take(rtol, index), _take(atol, index))
+                   for index in groups]
+        return np.concatenate([future.result() for future in futures])
+
+
+def solve_systems(systems, t_arr, rtol=None, atol=None, processes=None):
+    '''
+    Integrates the orbits of a list of class_2body systems, see solve_batch
+    for the accuracy, and kwargs
+    
+    Returns:
+    --------------
+    (K x T x 4N) array of states, [k] being the states of systems[k]
+    '''
+    init, masses = system_states(systems)
+    return solve_batch(init, masses, t_arr, rtol, atol, processes)
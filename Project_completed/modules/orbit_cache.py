@@ -0,0 +1,356 @@
+'''
+
+define a cache of orbit solutions, keyed only on what sets the motion
+(masses, initial state, time span and tolerances), not on the sizes of bodies,
+giving dense output interpolants for any times in the span. Orbits that only
+differ by a rigid translation share one solution, and solutions may be kept in
+an on-disk store, of bounded size, to be reused by later runs
+
+@author: Maciej Tomasz Jarema ppymj11
+
+'''
+
+# import modules
+import functools
+import hashlib
+import os
+import zipfile
+import numpy as np
+import scipy
+from scipy import integrate
+from scipy.integrate._ivp import bdf, common, lsoda, radau, rk
+import Project_completed.modules.class_2body as bodies
+
+# %%
+
+
+# number of orbit solutions kept in memory, read when the cache is built, on
+# import
+ORBIT_CACHE_SIZE = 32
+
+# directory of the on-disk store of orbit solutions, default=None does not
+# store them, set from the ORBIT_STORE environment variable, or by
+# set_orbit_store
+ORBIT_STORE = os.environ.get('ORBIT_STORE')
+
+# maximum total size of the store, in bytes, beyond which the least recently
+# used solutions are removed
+ORBIT_STORE_BYTES = 2**28
+
+# version of the equations of motion, part of every key (with the version of
+# scipy, whose interpolants are stored), such that solutions stored by older
+# versions are never used
+ORBIT_MODEL = 'nbody_newton_v1'
+
+# default solver of solve_ivp, and its tolerances
+ORBIT_METHOD = 'DOP853'
+ORBIT_RTOL = 1e-10
+ORBIT_ATOL = 1e-6
+
+# bits kept of the initial positions (about the centre of mass) and
+# velocities, relative to their largest value, in keys. Translated copies of a
+# system then get the same key, despite rounding in finding the centre of mass
+KEY_BITS = 40
+
+# solve_ivp methods that use the jacobian
+_IMPLICIT_METHODS = ('Radau', 'BDF', 'LSODA')
+
+# dense output classes of each solve_ivp method, to rebuild stored solutions
+# from their arrays, solutions of other (eg. user class) methods are not stored
+_DENSE_OUTPUTS = {'DOP853': rk.Dop853DenseOutput, 'RK45': rk.RkDenseOutput, 'RK23': rk.RkDenseOutput,
+                  'Radau': radau.RadauDenseOutput, 'BDF': bdf.BdfDenseOutput, 'LSODA': lsoda.LsodaDenseOutput}
+
+
+def set_orbit_store(path, max_bytes=None):
+    '''
+    Sets the directory of the on-disk orbit store, such that orbits solved
+    once are loaded by later runs, instead of solved again
+    
+    Parameters:
+    --------------
+    path - directory to store orbits in, created if needed, or None to
+           not use the store
+    
+    kwargs:
+    --------------
+    max_bytes - maximum total size of the store, in bytes, default=None
+                keeps ORBIT_STORE_BYTES
+    '''
+    global ORBIT_STORE, ORBIT_STORE_BYTES
+    ORBIT_STORE = None if path is None else str(path)
+    if max_bytes is not None:
+        ORBIT_STORE_BYTES = int(max_bytes)
+
+
+class Orbit():
+    '''
+    Dense output of the motion of a system, from a cached solution, moved
+    by its translation. Calling it with times gives the states at those
+    times, as odeint would.
+    
+    Attributes:
+    --------------
+    t_min, t_max - span of times it may be called at
+    shift - (4N) array added to the states of the cached solution
+    '''
+    
+    def __init__(self, solution, shift, t_span):
+        self.solution = solution
+        self.shift = shift
+        self.t_min, self.t_max = t_span
+    
+    def __call__(self, t):
+        '''
+        Gets the states at the given times
+        
+        Parameters:
+        --------------
+        t - float or (T) array of times within [t_min, t_max], in any order
+        
+        Returns:
+        --------------
+        (4N) array of the state at time t, or (T x 4N) array of states,
+        ordered as the initial state, as odeint returns
+        '''
+        t = np.asarray(t, dtype=float)
+        if np.any(t < self.t_min) or np.any(t > self.t_max):
+            raise ValueError('times must be within the solved span [' + str(self.t_min) + ', ' + str(self.t_max) + ']')
+        return self.solution(t).T + self.shift
+
+
+def _quantise(x):
+    '''
+    Rounds an array to KEY_BITS bits relative to its largest value
+    
+    Returns:
+    --------------
+    tuple of ints and their power of 2 exponent, as np.ldexp(ints, exponent)
+    '''
+    scale = np.max(np.abs(x))
+    exponent = (np.frexp(scale)[1] if scale > 0 else 0) - KEY_BITS
+    return tuple(int(i) for i in np.rint(np.ldexp(x, -exponent))), int(exponent)
+
+
+def centre_state(init, masses):
+    '''
+    Takes the initial positions of a system about its centre of mass (or
+    their mean, if all masses are zero), such that systems differing only
+    by a translation get the same key
+    
+    Parameters:
+    --------------
+    init - (4N) array of initial conditions, ordered as by initials()
+    masses - (N) array of masses of the bodies
+    
+    Returns:
+    --------------
+    state_key - hashable tuple of the masses and the centred initial state,
+                rounded to KEY_BITS bits
+    shift - (4N) array of the translation, init - shift being the centred
+            initial state
+    '''
+    init = np.asarray(init, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    n_bodies = len(masses)
+    pos = init[:2*n_bodies].reshape(n_bodies, 2)
+    if np.sum(masses) > 0:
+        cm = masses @ pos / np.sum(masses)
+    else:
+        cm = np.mean(pos, axis=0)
+    
+    state_key = (tuple(float(m) for m in masses), _quantise((pos - cm).ravel()), _quantise(init[2*n_bodies:]))
+    shift = np.concatenate((np.tile(cm, n_bodies), np.zeros(2*n_bodies)))
+    return state_key, shift
+
+
+def _key_state(state_key):
+    '''
+    Rebuilds the masses and centred initial state of a state key, from
+    centre_state
+    
+    Returns:
+    --------------
+    masses - (N) array of masses
+    init - (4N) array of the initial state
+    '''
+    masses, (pos, pos_exp), (vel, vel_exp) = state_key
+    init = np.concatenate((np.ldexp(np.array(pos, dtype=float), pos_exp),
+                           np.ldexp(np.array(vel, dtype=float), vel_exp)))
+    return np.array(masses), init
+
+
+def _store_path(key):
+    '''
+    Path of the store entry of the given orbit key, or None if the store
+    is not set
+    '''
+    if ORBIT_STORE is None or key[-1] not in _DENSE_OUTPUTS:
+        return None
+    
+    digest = hashlib.sha1(repr((key, ORBIT_MODEL, scipy.__version__)).encode()).hexdigest()
+    return os.path.join(ORBIT_STORE, digest + '.npz')
+
+
+def _evict(keep):
+    '''
+    Removes the least recently used entries of the store, until it is
+    within ORBIT_STORE_BYTES, never removing the entry at path keep
+    '''
+    entries = []
+    for name in os.listdir(ORBIT_STORE):
+        path = os.path.join(ORBIT_STORE, name)
+        if name.endswith('.npz') and path != keep:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # removed by another run
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    
+    total = sum(entry[1] for entry in entries) + os.path.getsize(keep)
+    for _, nbytes, path in sorted(entries):
+        if total <= ORBIT_STORE_BYTES:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= nbytes
+
+
+def _store_solution(path, solution):
+    '''
+    Saves a solution to the store, as the arrays of its interpolants, in
+    an .npz file written to a temporary file first, so that other runs
+    never load partial files, then evicts old entries.
+    
+    Each attribute of the interpolants is saved as one flat array of the
+    values of all steps, with an array of their shapes, as these may
+    change between steps (eg. the order of BDF)
+    '''
+    arrays = {'ts': solution.ts}
+    for name in vars(solution.interpolants[0]):
+        values = [np.asarray(getattr(interp, name)) for interp in solution.interpolants]
+        arrays['data_' + name] = np.concatenate([value.ravel() for value in values])
+        arrays['shape_' + name] = np.array([value.shape for value in values], dtype=np.int64).reshape(len(values), -1)
+    
+    os.makedirs(ORBIT_STORE, exist_ok=True)
+    temp = path + '.' + str(os.getpid()) + '.tmp'
+    with open(temp, 'wb') as file:
+        np.savez(file, **arrays)
+    os.replace(temp, path)
+    _evict(path)
+
+
+def _load_solution(path, method):
+    '''
+    Loads a solution of the given method from the store, marking it as
+    recently used, or gives None if it is not stored, or is not a valid
+    entry (eg. a partial file), removing such entries
+    '''
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            ts = data['ts']
+            names = [key[len('data_'):] for key in data.files if key.startswith('data_')]
+            attrs = [{} for _ in range(len(ts) - 1)]
+            for name in names:
+                values, shapes = data['data_' + name], data['shape_' + name]
+                offsets = np.concatenate(([0], np.cumsum(np.prod(shapes, axis=1))))
+                for i in range(len(attrs)):
+                    value = values[offsets[i]:offsets[i+1]].reshape(shapes[i])
+                    attrs[i][name] = value if value.ndim else value[()]
+        
+        # rebuild the interpolants of the method from their attributes
+        dense_output = _DENSE_OUTPUTS[method]
+        interpolants = []
+        for attr in attrs:
+            interp = dense_output.__new__(dense_output)
+            interp.__dict__.update(attr)
+            interpolants.append(interp)
+        solution = common.OdeSolution(ts, interpolants, alt_segment=method in ('BDF', 'LSODA'))
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, IndexError, EOFError, zipfile.BadZipFile):
+        # a partial or invalid entry
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return None
+    return solution
+
+
+@functools.lru_cache(maxsize=ORBIT_CACHE_SIZE)
+def _solve(key):
+    '''
+    Gets the dense output solution of the orbit of a key, from the store,
+    or by solving it with solve_ivp
+    '''
+    path = _store_path(key)
+    if path is not None:
+        solution = _load_solution(path, key[-1])
+        if solution is not None:
+            return solution
+    
+    # rebuild the initial state from the key
+    masses, init = _key_state(key[:3])
+    t0, t1, rtol, atol, method = key[3:]
+    
+    kwargs = {}
+    if method in _IMPLICIT_METHODS:
+        kwargs['jac'] = lambda t, y: bodies._nbody_jac(y, masses, bodies.G)
+    result = integrate.solve_ivp(lambda t, y: bodies._nbody_derivs(y, masses, bodies.G), (t0, t1), init,
+                                 method=method, rtol=rtol, atol=atol, dense_output=True, **kwargs)
+    if not result.success:
+        raise RuntimeError('orbit could not be solved: ' + result.message)
+    
+    if path is not None:
+        _store_solution(path, result.sol)
+    return result.sol
+
+
+def get_orbit(init, masses, t_arr, rtol=ORBIT_RTOL, atol=ORBIT_ATOL, method=ORBIT_METHOD):
+    '''
+    Gets the orbit of a system of N bodies, from the cache if the same
+    motion, or the same up to a translation, was solved before
+    
+    Parameters:
+    --------------
+    init - (4N) array of initial conditions, ordered as by initials()
+    masses - (N) array of masses of the bodies
+    t_arr - array of times the orbit is wanted at, from its first, t=t_arr[0]
+            of init, its span (first to last) being solved
+    
+    kwargs:
+    --------------
+    rtol, atol - tolerances of solve_ivp, default ORBIT_RTOL and ORBIT_ATOL
+    method - solve_ivp method, default ORBIT_METHOD
+    
+    Returns:
+    --------------
+    Orbit instance, giving states at any times of the span, eg. orbit(t_arr)
+    for the same array as odeint(system.jacobian_get, system.init, t_arr)
+    '''
+    init = np.asarray(init, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    t_span = (float(t_arr[0]), float(t_arr[-1]))
+    
+    state_key, shift = centre_state(init, masses)
+    key = state_key + (t_span[0], t_span[1], float(rtol), float(atol), method)
+    return Orbit(_solve(key), shift, (min(t_span), max(t_span)))
+
+
+def system_orbit(system, t_arr, rtol=ORBIT_RTOL, atol=ORBIT_ATOL, method=ORBIT_METHOD):
+    '''
+    Gets the orbit of a class_2body system, after initials(), see get_orbit
+    '''
+    masses = [getattr(system, 'body' + str(n)).Mass for n in range(system.length)]
+    return get_orbit(system.init, masses, t_arr, rtol, atol, method)
+
+
+def clear_cache():
+    '''
+    Clears the orbits cached in memory, not the on-disk store
+    '''
+    _solve.cache_clear()
@@ -0,0 +1,187 @@
+'''
+
+define functions to measure the distortion to shape caused by lensing,
+by the ratio of perimeter to area of lensed single source pixels, or exactly
+from the eigenvalues of the lens Jacobian
+
+@author: Maciej Tomasz Jarema ppymj11
+
+'''
+
+# import modules
+import numpy as np
+import Project_completed.modules.lensing_function as lensing
+import Project_completed.modules.lens_jacobian as jacobian
+
+# %%
+
+
+# weights of border pixels for each pattern of border neighbours, as in
+# skimage.measure.perimeter, patterns coded by 1*centre + 2*(number of edge
+# neighbours) + 10*(number of corner neighbours) in the border image
+PERIM_WEIGHTS = np.zeros(50)
+PERIM_WEIGHTS[[5, 7, 15, 17, 25, 27]] = 1
+PERIM_WEIGHTS[[21, 33]] = np.sqrt(2)
+PERIM_WEIGHTS[[13, 23]] = (1 + np.sqrt(2))/2
+
+
+def shape_maps(size, rc, eps, dom=1):
+    '''
+    Finds the area and perimeter (in pixels) of the lensed image of every
+    single source pixel at once, from the lens map and the labels of
+    neighbouring lensed pixels. Perimeters are measured as by
+    skimage.measure.regionprops (4-connectivity), for each source pixel
+    lensed on its own, with all of its lensed pixels taken as one region.
+    
+    Parameters:
+    --------------
+    - number of pixels per side of the square image, size (int)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    Returns:
+    --------------
+    area - (N x N) array of number of lensed pixels for each source pixel
+    perim - (N x N) array of perimeters of their lensed images
+    ratio - (N x N) array of perim/area, 0 where the source pixel is not
+            lensed into the image
+    All indexed in the same way as the source image.
+    '''
+    
+    # get the source pixel label of each lensed pixel, pad with labels that
+    # never match, so edges of the image count as outside of every region
+    ids = lensing.lens_source_ids(size, rc, eps, dom)
+    ids_pad = np.pad(ids, 1, constant_values=-1)
+    inside = ids >= 0
+    
+    # slices of the padded array giving the 4 edge and 4 corner neighbours
+    edges = [(slice(0, -2), slice(1, -1)), (slice(2, None), slice(1, -1)),
+             (slice(1, -1), slice(0, -2)), (slice(1, -1), slice(2, None))]
+    corners = [(slice(0, -2), slice(0, -2)), (slice(0, -2), slice(2, None)),
+               (slice(2, None), slice(0, -2)), (slice(2, None), slice(2, None))]
+    
+    # find which neighbours came from the same source pixel
+    same_edge = [ids_pad[n] == ids for n in edges]
+    same_corner = [ids_pad[n] == ids for n in corners]
+    
+    # border pixels are those not surrounded by their own region on all sides
+    border = inside & ~(same_edge[0] & same_edge[1] & same_edge[2] & same_edge[3])
+    border_pad = np.pad(border, 1, constant_values=False)
+    
+    # code the pattern of border neighbours in each region, as skimage does
+    # by convolving the border image
+    pattern = np.ones((size, size), dtype=int)
+    for n, same in zip(edges, same_edge):
+        pattern += 2*(same & border_pad[n])
+    for n, same in zip(corners, same_corner):
+        pattern += 10*(same & border_pad[n])
+    
+    # add up the area and weighted border of each region
+    area = np.bincount(ids[inside], minlength=size*size)
+    perim = np.bincount(ids[border], weights=PERIM_WEIGHTS[pattern[border]], minlength=size*size)
+    
+    # get the ratio, leaving 0 where nothing was lensed into the image
+    ratio = np.zeros(size*size)
+    np.divide(perim, area, out=ratio, where=area > 0)
+    
+    return area.reshape(size, size), perim.reshape(size, size), ratio.reshape(size, size)
+
+
+def ratio_map(size, rc, eps, dom=1):
+    '''
+    Finds the 2D map of shape distortion, as ratio of perimeter to area
+    of the lensed image of each source pixel. See shape_maps.
+    
+    Returns:
+    --------------
+    (N x N) array of perim/area, indexed as the source image
+    '''
+    return shape_maps(size, rc, eps, dom)[2]
+
+
+def stretch_field(r1, r2, rc, eps):
+    '''
+    Finds the stretch of small images along and across the critical curves,
+    from the eigenvalues 1 - kappa -+ |gamma| of the lens Jacobian, giving
+    the exact shape distortion at any points of the image plane
+    
+    Parameters:
+    --------------
+    r1, r2 - arrays (or floats) of reduced image plane coordinates
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    
+    Returns:
+    --------------
+    stretch_t - tangential stretch, 1/(1 - kappa - |gamma|)
+    stretch_r - radial stretch, 1/(1 - kappa + |gamma|)
+    axis_ratio - ratio of major to minor axis of the image of a small
+                 circle, >= 1, infinite on critical curves
+    All signed stretches, with magnification = stretch_t*stretch_r
+    '''
+    kappa, gamma1, gamma2 = jacobian.convergence_shear(r1, r2, rc, eps)
+    gamma = np.hypot(gamma1, gamma2)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stretch_t = 1/(1 - kappa - gamma)
+        stretch_r = 1/(1 - kappa + gamma)
+        axis_ratio = np.abs(1 - kappa + gamma)/np.abs(1 - kappa - gamma)
+    
+    # tangential eigenvalue may be the larger one inside the radial
+    # critical curve, where 1 - kappa < 0
+    axis_ratio = np.where(axis_ratio < 1, 1/axis_ratio, axis_ratio)
+    
+    return stretch_t, stretch_r, axis_ratio
+
+
+def stretch_maps(size, rc, eps, dom=1):
+    '''
+    Finds the stretches of stretch_field at each pixel centre of a lensed
+    image, as given by lensing_function.lens
+    
+    Parameters:
+    --------------
+    - number of pixels per side of the square image, size (int)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    Returns:
+    --------------
+    stretch_t, stretch_r, axis_ratio - (N x N) arrays, indexed as the
+    lensed image
+    '''
+    r1, r2 = jacobian.grid(size, dom)
+    return stretch_field(r1, r2, rc, eps)
+
+
+def axis_ratio_map(size, rc, eps, dom=1):
+    '''
+    Finds the 2D map of shape distortion, as the axis ratio of stretch_field
+    averaged over the lensed pixels of each source pixel, such that it is
+    indexed as ratio_map, but not limited by the pixel sampling of shapes
+    
+    Parameters:
+    --------------
+    - number of pixels per side of the square image, size (int)
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the image, as absolute value (default=1, giving range [-1, 1])
+    
+    Returns:
+    --------------
+    (N x N) array of mean axis ratios, indexed as the source image, 0 where
+    the source pixel is not lensed into the image
+    '''
+    ids = lensing.lens_source_ids(size, rc, eps, dom)
+    axis_ratio = stretch_maps(size, rc, eps, dom)[2]
+    
+    # average over the lensed pixels of each source pixel, in one pass
+    inside = (ids >= 0) & np.isfinite(axis_ratio)
+    area = np.bincount(ids[inside], minlength=size*size)
+    total = np.bincount(ids[inside], weights=axis_ratio[inside], minlength=size*size)
+    mean = np.zeros(size*size)
+    np.divide(total, area, out=mean, where=area > 0)
+    
+    return mean.reshape(size, size)
@@ -0,0 +1,210 @@
+'''
+
+define a cache of lens maps and source images in shared memory, such that
+worker processes of a pool (eg. for parameter sweeps) all use one copy of
+each, instead of building and holding their own
+
+Usage, with workers started by the pool initialiser, from a 'spawn' context,
+as numba's parallel threads do not survive being forked once they are used:
+
+    with shared_maps.SharedCache() as cache:
+        handles = [cache.publish_map(lensing.get_map(size, rc, eps, dom))]
+        image_h = cache.publish('source', image_s)
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(initializer=shared_maps.attach_maps, initargs=(handles,)) as pool:
+            pool.map(work, ...)   # work calls lensing.lens as normal, and
+                                  # shared_maps.attach(image_h) for the image
+    # the pool is left, and its workers done, before the cache unlinks memory
+
+@author: Maciej Tomasz Jarema ppymj11
+
+'''
+
+# import modules
+from multiprocessing import shared_memory
+import numpy as np
+import Project_completed.modules.lensing_function as lensing
+
+# %%
+
+
+# shared memory blocks attached to in this process, by name, kept open for as
+# long as the arrays viewing them are in use
+_attached = {}
+
+# maps pinned by attach_map in this process, by key, such that detach only
+# unpins these, not maps pinned by the user
+_attached_maps = {}
+
+
+class SharedCache():
+    '''
+    Owner, in the parent process, of arrays published to shared memory.
+    
+    Each published array is copied into shared memory once, and counted
+    for each time it is published under the same key. Releasing it as
+    many times unlinks its memory. All memory is unlinked by close(), or
+    on leaving a with block.
+    
+    Only publish() calls are counted, not attach() in workers, so release()
+    and close() must only be called once the workers using the arrays are
+    done, eg. after the pool is closed and joined.
+    '''
+    
+    def __init__(self):
+        # key: [SharedMemory, handle, reference count]
+        self._blocks = {}
+    
+    def publish(self, key, arr):
+        '''
+        Puts an array into shared memory, or counts another reference to
+        the one already published under this key
+        
+        Parameters:
+        --------------
+        key - hashable key of the array
+        arr - numpy array to publish
+        
+        Returns:
+        --------------
+        handle - picklable (name, shape, dtype) tuple, for attach()
+        '''
+        if key in self._blocks:
+            self._blocks[key][2] += 1
+            return self._blocks[key][1]
+        
+        arr = np.asarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        handle = (shm.name, arr.shape, arr.dtype.str)
+        self._blocks[key] = [shm, handle, 1]
+        return handle
+    
+    def publish_map(self, lens_map):
+        '''
+        Puts a LensMap, with its flat indices, source ids and inverse (as
+        used by lens_sparse for mostly empty sources), into shared memory,
+        building those not built yet once, here
+        
+        Parameters:
+        --------------
+        lens_map - LensMap, eg. from lensing_function.get_map
+        
+        Returns:
+        --------------
+        handle - picklable dict, for attach_map()
+        '''
+        key = lensing._map_key(lens_map)
+        offsets, pixels = lens_map.inverse
+        shared = {'index_1': lens_map.index_1, 'index_2': lens_map.index_2, 'flat': lens_map.flat,
+                  'source_ids': lens_map.source_ids, 'offsets': offsets, 'pixels': pixels}
+        arrays = {}
+        for name, arr in shared.items():
+            arrays[name] = self.publish(key + (name,), arr)
+        return {'key': key, 'arrays': arrays}
+    
+    def release(self, key):
+        '''
+        Drops one reference to the array published under key, unlinking
+        its shared memory when none are left. Workers attached to it are
+        not counted, call only once they are done with it.
+        '''
+        block = self._blocks[key]
+        block[2] -= 1
+        if block[2] == 0:
+            del self._blocks[key]
+            block[0].close()
+            block[0].unlink()
+    
+    def release_map(self, handle):
+        '''
+        Drops one reference to each array of a published LensMap
+        '''
+        for name in handle['arrays']:
+            self.release(handle['key'] + (name,))
+    
+    def close(self):
+        '''
+        Unlinks all published arrays, regardless of their references,
+        call only once the workers are done with them
+        '''
+        for shm, _, _ in self._blocks.values():
+            shm.close()
+            shm.unlink()
+        self._blocks = {}
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+
+
+def attach(handle):
+    '''
+    Gets a read only view of an array published by SharedCache.publish,
+    without copying it
+    
+    Parameters:
+    --------------
+    handle - handle returned by SharedCache.publish
+    
+    Returns:
+    --------------
+    read only numpy array in shared memory
+    '''
+    name, shape, dtype = handle
+    if name not in _attached:
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=_attached[name].buf)
+    arr.flags.writeable = False
+    return arr
+
+
+def attach_map(handle):
+    '''
+    Gets a LensMap viewing a map published by SharedCache.publish_map, and
+    pins it, so that lensing_function.get_map (and lens etc.) use it in
+    this process
+    
+    Parameters:
+    --------------
+    handle - handle returned by SharedCache.publish_map
+    
+    Returns:
+    --------------
+    LensMap instance
+    '''
+    size, rc, eps, dom, precision = handle['key']
+    arrays = {name: attach(h) for name, h in handle['arrays'].items()}
+    lens_map = lensing.LensMap(size, rc, eps, dom, precision,
+                               indices=(arrays['index_1'], arrays['index_2']),
+                               flat=arrays['flat'], source_ids=arrays['source_ids'],
+                               inverse=(arrays['offsets'], arrays['pixels']))
+    lensing.pin_map(lens_map)
+    _attached_maps[handle['key']] = lens_map
+    return lens_map
+
+
+def attach_maps(handles):
+    '''
+    Attaches to and pins each of the given published maps, for use as
+    the initialiser of pool workers
+    '''
+    for handle in handles:
+        attach_map(handle)
+
+
+def detach():
+    '''
+    Unpins the maps pinned by attach_map, and closes this process' views
+    of shared memory, arrays from attach must not be used after
+    '''
+    for key, lens_map in _attached_maps.items():
+        # leave maps the user pinned over it since
+        if lensing._pinned_maps.get(key) is lens_map:
+            lensing.unpin_map(lens_map)
+    _attached_maps.clear()
+    for shm in _attached.values():
+        shm.close()
+    _attached.clear()
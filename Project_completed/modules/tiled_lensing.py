@@ -0,0 +1,200 @@
+'''
+
+define functions to lens images too big to hold in memory, and rectangular
+images, one output tile at a time, reading only the part of the source
+image that each tile samples
+
+@author: Maciej Tomasz Jarema ppymj11
+
+'''
+
+# import modules
+import numpy as np
+from numba import njit, prange
+import Project_completed.modules.lensing_function as lensing
+
+# %%
+
+
+# side length, in pixels, of output tiles lensed at once
+TILE_SIZE = 1024
+
+# maximum number of bytes of source image read in for one tile, tiles whose
+# source footprint is larger are split into smaller ones
+TILE_SOURCE_BYTES = 2**30
+
+# side length below which tiles are no longer split, and sample the source
+# pixel by pixel instead, eg. near the centre of the lens for rc=0
+MIN_TILE = 16
+
+
+def domains(shape, dom=1):
+    '''
+    Gets the domain of each axis of a (possibly rectangular) image with
+    square pixels, such that the longer side spans [-dom, dom]
+    
+    Parameters:
+    --------------
+    shape - shape of the image, (rows, columns, ...)
+    dom - domain of the longer side, as absolute value (default=1)
+    
+    Returns:
+    --------------
+    dom_1, dom_2 - domains of rows and columns
+    '''
+    size_1, size_2 = shape[0], shape[1]
+    if size_1 >= size_2:
+        return float(dom), float(dom)*size_2/size_1
+    return float(dom)*size_1/size_2, float(dom)
+
+
+# not cached, as it compiles in lensing.ray_position, whose changes numba's
+# cache would not see, it only checks this file
+@njit
+def rect_source_pixel(i, j, rc, eps, dom_1, dom_2, size_1, size_2):
+    '''
+    Finds the source pixel sampled by lensed pixel (i, j) of a rectangular
+    image of size_1 x size_2 pixels, spanning [-dom_1, dom_1] and
+    [-dom_2, dom_2]. For square images same as lensing_function.source_pixel,
+    but with no wrapping around of negative indices.
+    
+    Returns:
+    --------------
+    index_1, index_2 - source pixel indices, both -1 if the ray leaves the
+    source plane
+    '''
+    p_width_1 = 2*dom_1/(size_1)
+    p_width_2 = 2*dom_2/(size_2)
+    r1 = 2*dom_1*i/(size_1) - dom_1 + p_width_1/2
+    r2 = 2*dom_2*j/(size_2) - dom_2 + p_width_2/2
+    t1, _ = lensing.ray_position(r1, r2, rc, eps, dom_1, p_width_1)
+    _, t2 = lensing.ray_position(r1, r2, rc, eps, dom_2, p_width_2)
+    
+    if not (t1 >= 0 and t1 < size_1 and t2 >= 0 and t2 < size_2):
+        return -1, -1
+    return int(t1), int(t2)
+
+
+# map of one output tile, parallel over its rows, not cached as above
+@njit(parallel=True)
+def _tile_map_kernel(rc, eps, dom_1, dom_2, size_1, size_2, row0, col0, index_1, index_2):
+    for a in prange(index_1.shape[0]):
+        for b in range(index_1.shape[1]):
+            index_1[a, b], index_2[a, b] = rect_source_pixel(row0 + a, col0 + b, rc, eps, dom_1, dom_2, size_1, size_2)
+
+
+def open_source(path, shape=None, dtype=np.uint8):
+    '''
+    Opens a source image from disk as a read only memory map, without
+    reading it in
+    
+    Parameters:
+    --------------
+    path - path to a .npy file, or a raw file of pixel values in C order
+    shape - (rows x columns x 3) shape, needed for raw files only
+    dtype - data type of raw files, default=uint8
+    
+    Returns:
+    --------------
+    memory mapped image array
+    '''
+    if str(path).endswith('.npy'):
+        return np.load(path, mmap_mode='r')
+    if shape is None:
+        raise ValueError('shape must be given for raw files')
+    return np.memmap(path, dtype=dtype, mode='r', shape=tuple(shape))
+
+
+def _fill_tile(image_s, out, row0, col0, index_1, index_2):
+    '''
+    Writes the lensed tile with its top left at (row0, col0) into out,
+    reading the source footprint of the tile, or splitting the tile if
+    that is larger than TILE_SOURCE_BYTES
+    '''
+    n_1, n_2 = index_1.shape
+    inside = index_1 >= 0
+    tile_l = np.zeros((n_1, n_2) + image_s.shape[2:], dtype=image_s.dtype)
+    
+    if np.any(inside):
+        # bounding box of the source pixels sampled by this tile
+        lo_1, hi_1 = index_1[inside].min(), index_1[inside].max()
+        lo_2, hi_2 = index_2[inside].min(), index_2[inside].max()
+        footprint = (hi_1 - lo_1 + 1)*(hi_2 - lo_2 + 1)*image_s[0, 0].nbytes
+        
+        if footprint > TILE_SOURCE_BYTES and min(n_1, n_2) > MIN_TILE:
+            # split into 4 tiles, each with a smaller footprint
+            h_1, h_2 = n_1//2, n_2//2
+            for a_0, a_1 in ((0, h_1), (h_1, n_1)):
+                for b_0, b_1 in ((0, h_2), (h_2, n_2)):
+                    _fill_tile(image_s, out, row0 + a_0, col0 + b_0, index_1[a_0:a_1, b_0:b_1], index_2[a_0:a_1, b_0:b_1])
+            return
+        elif footprint > TILE_SOURCE_BYTES:
+            # small tile over a large footprint, read only its pixels
+            tile_l[inside] = image_s[index_1[inside], index_2[inside]]
+        else:
+            # read in the footprint and copy from it
+            block = np.asarray(image_s[lo_1:hi_1+1, lo_2:hi_2+1])
+            tile_l[inside] = block[index_1[inside] - lo_1, index_2[inside] - lo_2]
+    
+    out[row0:row0+n_1, col0:col0+n_2] = tile_l
+
+
+def lens_tiled(image_s, rc, eps, dom=1, out=None, tile=TILE_SIZE):
+    '''
+    Lenses a (possibly rectangular) image one output tile at a time, such
+    that only one tile of lensed image, its map, and the part of the source
+    that it samples are held in memory. With memory mapped source and output
+    this lenses images much larger than the memory available.
+    
+    Pixels are square, with the longer side of the image spanning
+    [-dom, dom]. For square images this gives the same result as
+    lensing_function.lens, except that rays leaving the source plane give 0,
+    rather than wrapping around.
+    
+    Parameters:
+    --------------
+    - image as numpy array (rows x columns x 3), eg. from open_source, or
+      a path to a .npy file to open as a memory map
+    - central core radius rc (float)
+    - ellipticity eps (float)
+    - domain of the longer side, as absolute value (default=1)
+    
+    kwargs:
+    --------------
+    out - array of same shape and dtype as image_s to write the lensed image
+          into, eg. a memory map, or a path of a .npy file to create for it,
+          default=None creates a new array in memory
+    tile - side length of output tiles, in pixels, default=TILE_SIZE
+    
+    Returns:
+    --------------
+    array of the lensed image (rows x columns x 3), of the same dtype as
+    image_s (memory mapped, if out was)
+    '''
+    
+    if isinstance(image_s, str):
+        image_s = open_source(image_s)
+    
+    if out is None:
+        out = np.empty(image_s.shape, dtype=image_s.dtype)
+    elif isinstance(out, str):
+        out = np.lib.format.open_memmap(out, mode='w+', dtype=image_s.dtype, shape=image_s.shape)
+    elif out.shape != image_s.shape or out.dtype != image_s.dtype:
+        raise TypeError('out must have the same shape and dtype as the image')
+    
+    size_1, size_2 = image_s.shape[0], image_s.shape[1]
+    dom_1, dom_2 = domains(image_s.shape, dom)
+    
+    # lens each output tile, from its own map
+    for row0 in range(0, size_1, tile):
+        for col0 in range(0, size_2, tile):
+            n_1, n_2 = min(tile, size_1 - row0), min(tile, size_2 - col0)
+            index_1 = np.empty((n_1, n_2), dtype=np.int64)
+            index_2 = np.empty((n_1, n_2), dtype=np.int64)
+            _tile_map_kernel(float(rc), float(eps), dom_1, dom_2, size_1, size_2, row0, col0, index_1, index_2)
+            _fill_tile(image_s, out, row0, col0, index_1, index_2)
+    
+    if isinstance(out, np.memmap):
+        out.flush()
+    
+    return out
@@ -3,11 +3,10 @@
 # import modules
 import numpy as np
 import matplotlib.pyplot as plt
-import scipy
-from scipy import integrate
 import project.lensing_function as lensing
 import project.codes_physical.functions.class_2body as bodies
 import project.codes_physical.functions.draw_sphere as pix_draw
+import Project_completed.modules.orbit_batch as orbit_batch
 import matplotlib.widgets as widgets
 from scipy.signal import find_peaks
 from numba import jit
@@ -70,25 +69,32 @@ def binary_len(displacements, axis, size, t_arr, p_width, maxR, sizes, sizep, ep
     maxima = []
     minima = []
     
+    # set up 2 body systems for each displacement, in SI, using imported classes:
+    systems = []
     for com_disp in displacements:
-        # set up 2 body system parameters in SI, using imported classes:
         Star = bodies.body_def(Mass=2e30, size=sizes, x=-maxR/2 + com_disp, y=0, vx=0, vy=20000)  # Star
         Planet = bodies.body_def(Mass=2e30, size=sizep, x=maxR/2 + com_disp, y=0, vx=0, vy=-20000)  # Planet
         
         # Merge them into a system:
         system = bodies.system_def(Star, Planet)
         system.initials()  # produce initial conditions in system instance
-        
-        # #############################################################################
-        # simulation of 2 bodies orbiting in plane, for centre positions
-        # #############################################################################
+        systems.append(system)
+    
+    # #############################################################################
+    # simulation of 2 bodies orbiting in plane, for centre positions
+    # #############################################################################
+    
+    # solve all systems at once, in one odeint call, the displacements only
+    # translating the orbit, which is then solved once
+    solutions = orbit_batch.solve_systems(systems, t_arr)
+    
+    for system, solution in zip(systems, solutions):
+        # get the bodies of this system
+        Star, Planet = system.body0, system.body1
         
         # initialise the list that will store integrated, bolometric 'luminosity'
         lumin_bol = []
         
-        # call odeint to solve it:
-        solution = scipy.integrate.odeint(system.jacobian_get, system.init, t_arr)
-        
         # from it extract wanted positions
         xs_anim = solution[:, 0]
         xp_anim = solution[:, 2]
@@ -9,11 +9,10 @@
 # import modules
 import numpy as np
 import matplotlib.pyplot as plt
-import scipy
-from scipy import integrate
 import project.lensing_function as lensing
 import project.codes_physical.functions.class_2body as bodies
 import project.codes_physical.functions.draw_sphere as pix_draw
+import Project_completed.modules.orbit_cache as orbit_cache
 from scipy.signal import find_peaks
 from scipy.signal import argrelextrema
 import timeit
@@ -60,8 +59,8 @@ for planetsize in range(1, 10):
     # initialise the list that will store integrated, bolometric 'luminosity'
     lumin_bol = []
     
-    # call odeint to solve it:
-    solution = scipy.integrate.odeint(system.jacobian_get, system.init, t_arr)
+    # get the orbit, solved once, as planet size does not change the motion:
+    solution = orbit_cache.system_orbit(system, t_arr)(t_arr)
     
     # from it extract wanted positions
     xs_anim = solution[:, 0]
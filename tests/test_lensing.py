@@ -0,0 +1,66 @@
+'''
+
+tests comparing the lens maps, magnification and shape distortion maps with
+the direct lens equation, RGB marking and skimage.measure.regionprops they
+replace
+
+@author: Maciej Tomasz Jarema ppymj11
+
+'''
+
+# import modules
+import numpy as np
+import pytest
+import Project_completed.modules.lensing_function as lensing
+import Project_completed.modules.magnification as magnification
+import Project_completed.modules.mark_and_search_rgb as rgb
+import Project_completed.modules.shape_distortion as shape
+
+# %%
+
+
+# lens parameters tested, with and without ellipticity, odd and even sizes
+LENSES = [(64, 0.1, 0.0), (64, 0.2, 0.3), (63, 0.05, 0.1), (101, 0.3, 0.0)]
+
+
+@pytest.mark.parametrize('size, rc, eps', LENSES)
+def test_map_indices_symmetric(size, rc, eps):
+    # reflected indices must be bit identical to the direct lens equation
+    index_1, index_2 = lensing.map_indices(size, rc, eps)
+    sym_1, sym_2 = lensing.map_indices_symmetric(size, rc, eps)
+    np.testing.assert_array_equal(sym_1, index_1)
+    np.testing.assert_array_equal(sym_2, index_2)
+
+
+@pytest.mark.parametrize('size, rc, eps', [(64, 0.1, 0.0), (64, 0.2, 0.3), (63, 0.05, 0.1)])
+def test_mag_map_rgb(size, rc, eps):
+    # mark each source pixel with its RGB code, lens and count the codes
+    image_s = rgb.rgb_track_mark(np.zeros((size, size, 3)))
+    image_l = lensing.lens(image_s, rc, eps)
+    counts = rgb.count_rbgs(np.zeros((size, size)), image_l)
+    
+    mags = magnification.mag_map(size, rc, eps)
+    
+    # the code of pixel (0, 0) is black, as are rays that left the plane, so
+    # the RGB count only bounds it
+    assert mags[0, 0] <= counts[0, 0]
+    mags[0, 0] = counts[0, 0]
+    np.testing.assert_array_equal(mags, counts)
+
+
+@pytest.mark.parametrize('size, rc, eps', [(48, 0.1, 0.0), (48, 0.2, 0.3), (47, 0.05, 0.1)])
+def test_shape_maps_regionprops(size, rc, eps):
+    measure = pytest.importorskip('skimage.measure')
+    
+    # label lensed pixels by their source pixel, lensed on its own each
+    ids = lensing.lens_source_ids(size, rc, eps)
+    area, perim, ratio = shape.shape_maps(size, rc, eps)
+    
+    area_ref = np.zeros(size*size)
+    perim_ref = np.zeros(size*size)
+    for region in measure.regionprops(ids + 1):
+        area_ref[region.label - 1] = region.area
+        perim_ref[region.label - 1] = region.perimeter
+    
+    np.testing.assert_array_equal(area.ravel(), area_ref)
+    np.testing.assert_allclose(perim.ravel(), perim_ref, rtol=1e-12, atol=1e-12)
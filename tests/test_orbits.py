@@ -0,0 +1,82 @@
+'''
+
+tests comparing the exact Kepler orbits and the batched odeint of many systems
+with each system integrated on its own
+
+@author: Maciej Tomasz Jarema ppymj11
+
+'''
+
+# import modules
+import numpy as np
+import pytest
+from scipy import integrate
+import Project_completed.modules.kepler_orbits as kepler
+
+# %%
+
+
+year = 3.156e7
+AU = 1.496e11
+
+
+def two_body_derivs(t, y, masses):
+    # Newtonian right hand side of 2 bodies, ordered as by initials()
+    d = y[2:4] - y[0:2]
+    acc = kepler.G*d/np.linalg.norm(d)**3
+    return np.concatenate((y[4:8], masses[1]*acc, -masses[0]*acc))
+
+
+# bound (circular, eccentric) and unbound orbits of 2 bodies
+SYSTEMS = [([0, 0, AU, 0, 0, 0, 0, 29800.], [2e30, 6e24]),
+           ([-AU/2, 0, AU/2, 0, 0, 15000., 0, -15000.], [2e30, 2e30]),
+           ([0, 0, AU, 0, 0, 0, 0, 60000.], [2e30, 6e24])]
+
+
+@pytest.mark.parametrize('init, masses', SYSTEMS)
+def test_propagate_solve_ivp(init, masses):
+    t = np.linspace(0, 2*year, 400)
+    ref = integrate.solve_ivp(two_body_derivs, (t[0], t[-1]), init, t_eval=t, args=(np.array(masses),),
+                              method='DOP853', rtol=1e-13, atol=1e-3).y.T
+    
+    states = kepler.propagate(init, masses, t)
+    scale = np.abs(ref).max(axis=0)
+    assert np.max(np.abs(states - ref)/scale) < 1e-8
+
+
+def test_propagate_batch():
+    # batches of systems, at times in any order, match each system alone
+    t = np.linspace(0, year, 50)[::-1]
+    init = np.array([system[0] for system in SYSTEMS], dtype=float)
+    masses = np.array([system[1] for system in SYSTEMS])
+    states = kepler.propagate(init, masses, t)
+    for k in range(len(SYSTEMS)):
+        np.testing.assert_array_equal(states[k], kepler.propagate(init[k], masses[k], t))
+
+
+def test_solve_batch_odeint():
+    # class_2body, used by orbit_batch, needs matplotlib
+    pytest.importorskip('matplotlib')
+    import Project_completed.modules.orbit_batch as batch
+    
+    t = np.linspace(0, year, 300)
+    init = np.array([[0, 0, AU, 0, 0, 0, 0, 29800.],
+                     [-AU/2, 0, AU/2, 0, 0, 15000., 0, -15000.],
+                     [-AU/2, 0, AU/2, 0, 0, 16000., 0, -16000.]])
+    masses = np.array([[2e30, 6e24], [2e30, 2e30], [2e30, 2e30]])
+    alone = np.array([integrate.odeint(batch._batch_rhs, init[k], t, args=(masses[k:k+1],), rtol=1e-11, atol=1e-6)
+                      for k in range(3)])
+    
+    # a single system is integrated exactly as alone
+    np.testing.assert_array_equal(batch.solve_batch(init[:1], masses[:1], t, rtol=1e-11, atol=1e-6)[0], alone[0])
+    
+    # systems sharing steps are within the tolerance of the worst of them
+    states = batch.solve_batch(init, masses, t, rtol=1e-11, atol=1e-6)
+    scale = np.abs(alone).max(axis=1)[:, None, :]
+    assert np.max(np.abs(states - alone)/scale) < 1e-6
+    
+    # translated copies are integrated once, from the first of them
+    shift = np.array([3e9, -1e9, 3e9, -1e9, 0, 0, 0, 0])
+    copies = batch.solve_batch([init[1], init[1] + shift], masses[1:], t, rtol=1e-11, atol=1e-6)
+    np.testing.assert_array_equal(copies[0], alone[1])
+    np.testing.assert_allclose(copies[1], alone[1] + shift, rtol=0, atol=1e-3)